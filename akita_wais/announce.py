@@ -0,0 +1,58 @@
+import time
+import random
+import threading
+from .common import server_log as log
+
+
+class AnnounceScheduler:
+    """
+    Decides when the server announces.
+
+    The first announce goes out at start, then the interval doubles from
+    min_interval up to max_interval, so a new server is found quickly but a
+    settled one spends little airtime. Each wait is jittered by +-jitter so
+    servers that started together drift apart instead of announcing in
+    bursts. trigger() (a catalog change) announces again right away, no sooner
+    than min_interval after the previous one, and restarts the back-off.
+    """
+
+    def __init__(self, announce, min_interval=15, max_interval=900, jitter=0.1, backoff=2.0):
+        self._announce = announce
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.jitter = jitter
+        self.backoff = backoff
+        self._interval = min_interval
+        self._last_sent = 0.0
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="akita-announce", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._changed.set()
+
+    def trigger(self):
+        self._changed.set()
+
+    def _send(self):
+        try:
+            self._announce()
+        except Exception as e:
+            log.error(f"Error during announcement: {e}")
+        self._last_sent = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._send()
+            delay = self._interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self._interval = min(self.max_interval, self._interval * self.backoff)
+            if self._changed.wait(delay) and not self._stop.is_set():
+                # A burst of changes shares one announce, at most one per min_interval
+                self._stop.wait(max(0.0, self.min_interval - (time.monotonic() - self._last_sent)))
+                self._changed.clear()
+                self._interval = self.min_interval
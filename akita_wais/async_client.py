@@ -0,0 +1,208 @@
+import asyncio
+from .client import AkitaWAISClient
+from .common import (
+    client_log as log, ACTION_LIST, ACTION_PEER_LIST, ACTION_MANIFEST, ACTION_STAT,
+    STATUS_OK, STATUS_ERROR, STATUS_BUSY, CAP_RANGE, CAP_RESOURCE, CHUNKED_LIST_VERSION
+)
+from .federation import SearchMerger
+from .resume import PartialDownload
+
+
+class AsyncAkitaWAISClient:
+    """
+    asyncio front end for AkitaWAISClient.
+
+    RNS delivers responses, data and link events on its own threads. Those
+    complete the same per-request futures the blocking client uses, and this
+    class awaits them on the event loop (asyncio.wrap_future), so no coroutine
+    polls or parks a thread while a request is in flight. Every method accepts
+    a timeout and can be cancelled; cancelling abandons the request and
+    discards any partial transfer. Only establishing a new link and
+    file-assembly work (resume, swarm) run in the default executor.
+    """
+
+    def __init__(self, config, reticulum_instance):
+        # Wraps rather than subclasses, so the blocking code paths run unchanged in the executor
+        self.client = AkitaWAISClient(config, reticulum_instance)
+        self.client_config = self.client.client_config
+        self.pool = self.client.pool
+
+    def start(self, identity):
+        return self.client.start(identity)
+
+    def stop(self):
+        self.client.stop()
+
+    @property
+    def running(self):
+        return self.client.running
+
+    def list_discovered_servers(self):
+        return self.client.list_discovered_servers()
+
+    # --- Plumbing ---
+
+    async def _lease(self, server_info):
+        link = self.pool.try_acquire(server_info)
+        if link is not None: return link
+        # Connecting waits for the link-established callback; keep it off the event loop
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self.pool.acquire, server_info)
+        try:
+            return await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # acquire() cannot be interrupted; hand back the lease it returns once it finishes
+            acquiring.add_done_callback(lambda f: self._release_abandoned(f, server_info))
+            raise
+
+    def _release_abandoned(self, acquiring, server_info):
+        if acquiring.cancelled() or acquiring.exception() is not None: return
+        if acquiring.result() is not None: self.pool.release(server_info["hash"])
+
+    async def _await_response(self, request_id, future, timeout):
+        waiter = asyncio.wrap_future(future)
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(waiter), timeout)
+                except asyncio.TimeoutError:
+                    if self.client._transfer_progressing(request_id, timeout): continue
+                    self.client._abandon_request(request_id)
+                    return {"status": STATUS_ERROR, "message": "Timeout"}
+        except asyncio.CancelledError:
+            self.client._abandon_request(request_id)
+            raise
+
+    async def request(self, request, server=None, timeout=None):
+        """Sends one raw request and awaits its response; honours busy back-off like the blocking client."""
+        server_info = self.client._target(server)
+        if not server_info: return {"status": STATUS_ERROR, "message": "Not connected"}
+        timeout = timeout or self.client_config.get('request_timeout_sec', 30)
+        max_wait = self.client_config.get('busy_max_wait_sec', 30)
+
+        while True:
+            link = await self._lease(server_info)
+            if link is None: return {"status": STATUS_ERROR, "message": f"Could not reach {server_info.get('name', server_info['hash'])}"}
+            try:
+                request_id, future = self.client._start_request(link, request)
+                response = await self._await_response(request_id, future, timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                response = {"status": STATUS_ERROR, "message": str(e)}
+            finally:
+                self.pool.release(server_info["hash"])
+
+            if response.get("status") != STATUS_BUSY: return response
+            retry_after = response.get("retry_after", max_wait + 1)
+            if retry_after > max_wait: return response
+            max_wait -= retry_after
+            log.info(f"{server_info.get('name')} is busy; retrying in {retry_after}s")
+            await asyncio.sleep(retry_after)
+
+    async def _in_executor(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    # --- API ---
+
+    async def select_server(self, server_info):
+        link = await self._lease(server_info)
+        if link is None: return False
+        self.pool.release(server_info["hash"])
+        self.client._active_server = server_info
+        return True
+
+    async def get_server_list(self, server=None, timeout=None):
+        server_info = self.client._target(server)
+        if not server_info: return {"status": STATUS_ERROR, "message": "Not connected"}
+        cached = self.client._cached_listing(server_info)
+        if cached: return cached
+        request = {"action": ACTION_LIST}
+        since_version = self.client._listing_version(server_info)
+        if since_version is not None: request["since_version"] = since_version
+        chunked = self.client._protocol_at_least(CHUNKED_LIST_VERSION, server_info)
+
+        chunks, offset = [], 0
+        while offset is not None:
+            res = await self.request(dict(request, offset=offset) if chunked else request, server_info, timeout)
+            if res.get("status") != STATUS_OK: return res
+            chunks.append(res)
+            offset = res.get("next_offset") if chunked and "added" not in res else None
+        return self.client._merge_listing(server_info, chunks)
+
+    async def get_peer_list(self, server=None, timeout=None):
+        return await self.request({"action": ACTION_PEER_LIST}, server, timeout)
+
+    async def get_manifest(self, filename, server=None, timeout=None):
+        return await self.request({"action": ACTION_MANIFEST, "filename": filename}, server, timeout)
+
+    async def search_files(self, query, offset=0, limit=None, server=None, digests=False, timeout=None):
+        request = self.client._search_request(query, offset, limit, digests)
+        server_info = self.client._target(server)
+        if not server_info: return {"status": STATUS_ERROR, "message": "Not connected"}
+        cached, send = self.client._search_plan(server_info, request)
+        if cached: return cached
+        return self.client._search_result(server_info, request, await self.request(send, server_info, timeout))
+
+    async def stat_file(self, filename, server=None, timeout=None):
+        return await self.request({"action": ACTION_STAT, "filename": filename}, server, timeout)
+
+    async def get_file(self, filename, resume=True, server=None, timeout=None, tail=None, stat=None):
+        if stat is None and self.client._wants_stat(server):
+            stat = await self.stat_file(filename, server, timeout)
+        if stat is not None:
+            placed = self.client._place_from_store(filename, stat)
+            if placed: return placed
+        partial = PartialDownload.load(self.client.dest_path(filename))
+        if partial:
+            if resume and self.client._server_supports(CAP_RANGE, server):
+                # Block verification and reassembly are file work; run the blocking resume path
+                return await self._in_executor(self.client._resume_file, filename, partial, server, timeout)
+            partial.discard()
+        if self.client._wants_tail(filename, tail, server):
+            plan = self.client._tail_request
+        elif self.client._wants_delta(filename, server):
+            plan = self.client._delta_request
+        else:
+            plan = None
+        if plan:
+            # Hashing and rebuilding read the local copy; only the request itself is awaited on the loop
+            block_size, request = await self._in_executor(plan, filename, server)
+            response = await self.request(request, server, timeout)
+            return await self._in_executor(self.client._apply_delta, filename, block_size, response)
+        if self.client._server_supports(CAP_RESOURCE, server) and self.client._server_supports(CAP_RANGE, server):
+            # Resource-mode downloads are assembled range by range in the partial file, like a resume
+            return await self._in_executor(self.client._get_in_ranges, filename, server, timeout)
+        return await self.request(self.client._get_request(filename, server), server, timeout)
+
+    async def swarm_download(self, filename, server=None, max_sources=None):
+        return await self._in_executor(self.client.swarm_download, filename, server, max_sources)
+
+    async def iter_search_all(self, query, top_n=None, deadline=None, limit=None):
+        """Async generator of (server_info, response) as each server answers; stops at the deadline."""
+        deadline = deadline or self.client_config.get('federated_deadline_sec', 15)
+        loop = asyncio.get_running_loop()
+        pending = {
+            asyncio.ensure_future(self.search_files(query, limit=limit, server=s, digests=True)): s
+            for s in self.client.federation_targets(top_n)
+        }
+        stop_at = loop.time() + deadline
+        try:
+            while pending:
+                remaining = stop_at - loop.time()
+                if remaining <= 0: break
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield pending.pop(task), task.result()
+
+            for server_info in pending.values():
+                log.info(f"Federated search: {server_info.get('name')} missed the {deadline}s deadline")
+                yield server_info, {"status": STATUS_ERROR, "message": "Deadline exceeded"}
+        finally:
+            for task in pending: task.cancel()
+
+    async def search_all(self, query, top_n=None, deadline=None, limit=None):
+        if not self.client.federation_targets(top_n): return {"status": STATUS_ERROR, "message": "No servers discovered"}
+        merger = SearchMerger()
+        async for server_info, response in self.iter_search_all(query, top_n, deadline, limit):
+            merger.add_response(server_info, response)
+        return merger.summary()
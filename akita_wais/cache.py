@@ -0,0 +1,402 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from .common import server_log as log, MAX_TRANSFER_RAM, calculate_sha256, block_digest
+from .streaming import CompressingReader
+from .compression import get_codec, profile_file, choose, DEFAULT_CODEC, LEGACY_CODECS
+
+INDEX_FILE = "index.json"
+SAVE_DELAY = 5      # seconds; index writes after builds and evictions are batched this long
+
+
+def cache_key(entry):
+    """Cache key for a catalog entry: any change to path, size, mtime or inode invalidates it."""
+    ident = f"{os.path.abspath(entry.path)}|{entry.size}|{entry.mtime_ns}|{entry.inode}"
+    return hashlib.sha256(ident.encode('utf-8')).hexdigest()[:32]
+
+
+class TransferCache:
+    """
+    Persistent cache of SHA-256 digests and compressed payloads, keyed by
+    (path, size, mtime_ns, inode).
+
+    Each record holds the transfer metadata for one file version, including a
+    per-codec profile measured on a few KB of the file. When compression pays
+    off, the artifact (in the codec that suits a link of link_bps bytes/s) is
+    kept on disk next to the index so repeat GETs are served straight from it. Artifacts are evicted least-recently-used
+    once their total size exceeds max_bytes. A client that cannot decode the
+    artifact's codec gets a zlib fallback artifact, built on its first request.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, link_bps=1000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.link_bps = link_bps
+        self._records = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._dirty = False
+        self._save_timer = None
+        self._warmup_thread = None
+        self._running = False
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            log.error(f"Could not create cache dir {self.cache_dir}: {e}")
+        self._load()
+
+    # --- Persistence ---
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _artifact_path(self, key):
+        return os.path.join(self.cache_dir, key + ".z")
+
+    def _load(self):
+        records = {}
+        try:
+            with open(self._index_path(), 'r') as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.error(f"Transfer cache index unreadable, starting empty: {e}")
+
+        for key, record in records.items():
+            artifact = record.get("artifact")
+            if artifact and not os.path.exists(os.path.join(self.cache_dir, artifact)):
+                continue
+            fallback = record.get("fallback") or {}
+            if fallback.get("artifact") and not os.path.exists(os.path.join(self.cache_dir, fallback["artifact"])):
+                record.pop("fallback")
+            self._records[key] = record
+        self._sweep_orphans()
+        log.info(f"Transfer cache loaded {len(self._records)} records from {self.cache_dir}")
+
+    def _sweep_orphans(self):
+        """Removes artifacts the index does not know (built before a crash) and leftover temp files."""
+        known = {name for r in self._records.values() for name, _ in self._artifacts(r)}
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        orphans = [n for n in names if n.endswith(".tmp") or (n.endswith(".z") and n not in known)]
+        for name in orphans:
+            self._remove_quietly(os.path.join(self.cache_dir, name))
+        if orphans: log.info(f"Transfer cache removed {len(orphans)} orphaned files")
+
+    def _mark_dirty(self):
+        """Schedules an index save SAVE_DELAY seconds out, so a crash loses at most that much; caller holds self._lock."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(SAVE_DELAY, self._save_scheduled)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save_scheduled(self):
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            snapshot = dict(self._records)
+            self._dirty = False
+        tmp_path = self._index_path() + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._index_path())
+        except OSError as e:
+            log.error(f"Could not save transfer cache index: {e}")
+
+    # --- Lifecycle ---
+
+    def start(self, entries, warm_up=True):
+        """
+        Drops records for files no longer in the catalog and, with warm_up,
+        prepares every entry that is not cached yet in the background.
+        """
+        self._running = True
+        live_keys = {cache_key(e) for e in entries}
+        with self._lock:
+            for key in [k for k in self._records if k not in live_keys]:
+                self._drop(key)
+        if not warm_up: return
+        self._warmup_thread = threading.Thread(target=self._warm_up, args=(entries,), daemon=True)
+        self._warmup_thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            if self._save_timer: self._save_timer.cancel()
+            self._save_timer = None
+        self.save()
+
+    def _warm_up(self, entries):
+        started = time.time()
+        built = 0
+        for entry in entries:
+            if not self._running: break
+            record = self.lookup(entry, touch=False)
+            if record and not record.get("streamed"): continue
+            try:
+                record = self.prepare(entry)
+                if record.get("streamed"):
+                    self._fill_streamed(entry, record["codec"])
+                built += 1
+            except OSError as e:
+                log.debug(f"Warm-up skipped {entry.name}: {e}")
+        self.save()
+        log.info(f"Transfer cache warm-up prepared {built} files in {time.time() - started:.1f}s")
+
+    def on_catalog_change(self, added, removed, changed):
+        """FileCatalog listener: drops records for files that were removed or modified."""
+        stale_paths = {os.path.abspath(e.path) for e in changed}
+        removed = set(removed)
+        with self._lock:
+            for key, record in list(self._records.items()):
+                if record["path"] in stale_paths or record["name"] in removed:
+                    self._drop(key)
+
+    # --- Lookup / build ---
+
+    def lookup(self, entry, touch=True):
+        key = cache_key(entry)
+        with self._lock:
+            record = self._records.get(key)
+            if record and touch:
+                record["last_access"] = time.time()
+            return dict(record) if record else None
+
+    def artifact_path(self, record):
+        return os.path.join(self.cache_dir, record["artifact"]) if record.get("artifact") else None
+
+    def open_payload(self, entry):
+        """Returns (record, open file) for the bytes to put on the wire for entry."""
+        for _ in range(2):
+            record = self.prepare(entry)
+            try:
+                return record, open(self.artifact_path(record) or entry.path, 'rb')
+            except FileNotFoundError:
+                # Artifact evicted between lookup and open; rebuild once
+                with self._lock:
+                    self._drop(cache_key(entry))
+        raise FileNotFoundError(entry.path)
+
+    def open_fallback(self, entry):
+        """
+        (record, open file) for a client that cannot decode the artifact's
+        codec: the zlib fallback artifact, built on the first such request and
+        kept with the record. Files beyond MAX_TRANSFER_RAM, or that zlib does
+        not shrink, are sent raw from the source.
+        """
+        record = self.prepare(entry)
+        raw = dict(record, compressed=False, codec=None, streamed=False, size=record["original_size"])
+        if entry.size > MAX_TRANSFER_RAM: return raw, open(entry.path, 'rb')
+        fallback = record.get("fallback") or self._build_fallback(entry, record)
+        if fallback.get("artifact"):
+            try:
+                payload = open(os.path.join(self.cache_dir, fallback["artifact"]), 'rb')
+                return dict(record, compressed=True, codec=fallback["codec"], size=fallback["size"]), payload
+            except FileNotFoundError:
+                pass    # evicted since the lookup; this one request goes raw
+        return raw, open(entry.path, 'rb')
+
+    def _build_fallback(self, entry, record):
+        key = cache_key(entry)
+        with open(entry.path, 'rb') as f:
+            raw_data = f.read()
+        codec = choose(record.get("profile") or {}, self.link_bps, LEGACY_CODECS) or DEFAULT_CODEC
+        compressed_data = get_codec(codec).compress(raw_data)
+        fallback = {"artifact": None}
+        if len(compressed_data) < len(raw_data):
+            fallback = {"artifact": f"{key}.{codec}.z", "codec": codec, "size": len(compressed_data)}
+            artifact_path = os.path.join(self.cache_dir, fallback["artifact"])
+            tmp_path = f"{artifact_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed_data)
+            os.replace(tmp_path, artifact_path)
+        with self._lock:
+            stored = self._records.get(key)
+            if stored is None:
+                # Dropped (file changed or evicted) while building
+                if fallback["artifact"]: self._remove_quietly(os.path.join(self.cache_dir, fallback["artifact"]))
+                return {"artifact": None}
+            stored["fallback"] = fallback
+            self._mark_dirty()
+            self._evict(keep=key)
+        if fallback["artifact"]: log.info(f"Cached {entry.name} zlib fallback ({codec})")
+        return fallback
+
+    def prepare(self, entry):
+        """Returns the transfer record for entry, building and caching it on a miss."""
+        record = self.lookup(entry)
+        if record: return record
+
+        key = cache_key(entry)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have built it while we waited
+            record = self.lookup(entry)
+            if record: return record
+            record = self._build(entry, key)
+            with self._lock:
+                self._records[key] = record
+                self._mark_dirty()
+                self._key_locks.pop(key, None)
+                self._evict(keep=key)
+        return dict(record)
+
+    def _build(self, entry, key):
+        record = {
+            "name": entry.name,
+            "path": os.path.abspath(entry.path),
+            "original_size": entry.size,
+            "artifact": None,
+            "compressed": False,
+            "codec": None,
+            "profile": profile_file(entry.path, entry.size),
+            "last_access": time.time()
+        }
+        codec = choose(record["profile"], self.link_bps)
+
+        if entry.size > MAX_TRANSFER_RAM:
+            if codec:
+                # Compressed on the fly while sending; digest and artifact are filled in by the first pass
+                record.update({"compressed": True, "streamed": True, "codec": codec, "sha256": None, "size": None})
+                return record
+
+            # Incompressible: digest only, payload is sent raw from the source
+            sha256_hash = hashlib.sha256()
+            with open(entry.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    sha256_hash.update(chunk)
+            record["sha256"] = sha256_hash.hexdigest()
+            record["size"] = entry.size
+            return record
+
+        with open(entry.path, 'rb') as f:
+            raw_data = f.read()
+        record["sha256"] = calculate_sha256(raw_data)
+        record["original_size"] = len(raw_data)
+        record["size"] = len(raw_data)
+
+        compressed_data = get_codec(codec).compress(raw_data) if codec else raw_data
+        if len(compressed_data) < len(raw_data):
+            artifact = key + ".z"
+            tmp_path = self._artifact_path(key) + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed_data)
+            os.replace(tmp_path, self._artifact_path(key))
+            record["artifact"] = artifact
+            record["compressed"] = True
+            record["codec"] = codec
+            record["size"] = len(compressed_data)
+            log.info(f"Cached {entry.name}: {(len(compressed_data)/len(raw_data))*100:.1f}% of original ({codec})")
+        return record
+
+    # --- Chunk manifests ---
+
+    def manifest(self, entry, block_size):
+        """Per-block digests for entry (cached with its record), plus the full-file SHA-256."""
+        record = self.prepare(entry)
+        cached = record.get("manifest")
+        if cached and cached["block_size"] == block_size and record.get("sha256"):
+            return dict(cached, size=record["original_size"], sha256=record["sha256"])
+
+        sha256_hash = hashlib.sha256()
+        blocks = []
+        with open(entry.path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                sha256_hash.update(block)
+                blocks.append(block_digest(block))
+        manifest = {"block_size": block_size, "blocks": blocks}
+
+        with self._lock:
+            stored = self._records.get(cache_key(entry))
+            if stored is not None:
+                stored["manifest"] = manifest
+                stored["sha256"] = sha256_hash.hexdigest()
+                self._mark_dirty()
+        return dict(manifest, size=entry.size, sha256=sha256_hash.hexdigest())
+
+    # --- Streamed (large file) artifacts ---
+
+    def begin_artifact(self, entry):
+        """Opens a temp file to capture a streamed artifact, or None if it could not fit the cache."""
+        if entry.size > self.max_bytes: return None
+        tmp_path = f"{self._artifact_path(cache_key(entry))}.{threading.get_ident()}.tmp"
+        try:
+            return open(tmp_path, 'wb')
+        except OSError as e:
+            log.error(f"Could not create cache artifact for {entry.name}: {e}")
+            return None
+
+    def complete_stream(self, entry, reader, sink):
+        """Records the digest (and artifact, if captured) produced by a streamed pass over entry."""
+        key = cache_key(entry)
+        tmp_path = sink.name if sink else None
+        if sink: sink.close()
+
+        with self._lock:
+            record = self._records.get(key)
+            if not reader.finished or record is None:
+                if tmp_path: self._remove_quietly(tmp_path)
+                return
+            record["sha256"] = reader.sha256
+            if tmp_path:
+                os.replace(tmp_path, self._artifact_path(key))
+                record.update({"artifact": key + ".z", "size": reader.compressed_size, "streamed": False, "codec": reader.codec})
+                log.info(f"Cached {entry.name}: {(reader.compressed_size/max(reader.raw_size, 1))*100:.1f}% of original")
+            self._mark_dirty()
+            self._evict(keep=key)
+
+    def _fill_streamed(self, entry, codec):
+        sink = self.begin_artifact(entry)
+        if not sink: return
+        with CompressingReader(open(entry.path, 'rb'), codec=codec, sink=sink) as reader:
+            while reader.read(1024 * 1024):
+                if not self._running: break
+        self.complete_stream(entry, reader, sink)
+
+    @staticmethod
+    def _artifacts(record):
+        """(file name, size) of every artifact kept for record."""
+        found = [(record["artifact"], record["size"])] if record.get("artifact") else []
+        fallback = record.get("fallback") or {}
+        if fallback.get("artifact"): found.append((fallback["artifact"], fallback["size"]))
+        return found
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # --- Eviction ---
+
+    def _drop(self, key):
+        record = self._records.pop(key, None)
+        if not record: return
+        self._mark_dirty()
+        for name, _ in self._artifacts(record):
+            self._remove_quietly(os.path.join(self.cache_dir, name))
+
+    def _evict(self, keep=None):
+        """LRU eviction of artifacts, never evicting keep; caller holds self._lock."""
+        total = sum(size for r in self._records.values() for _, size in self._artifacts(r))
+        if total <= self.max_bytes: return
+        for key, record in sorted(self._records.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes: break
+            artifacts = self._artifacts(record)
+            if key == keep or not artifacts: continue
+            total -= sum(size for _, size in artifacts)
+            self._drop(key)
@@ -0,0 +1,333 @@
+import os
+import sys
+import stat
+import time
+import struct
+import select
+import hashlib
+import threading
+import ctypes
+import ctypes.util
+from collections import namedtuple, deque
+from .common import server_log as log
+
+# One record per shared file, captured from a single stat at scan time.
+CatalogEntry = namedtuple("CatalogEntry", ["name", "path", "size", "mtime_ns", "inode"])
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+               IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify. Raises OSError where unsupported."""
+
+    def __init__(self, path):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def read_events(self, timeout):
+        """Returns a list of (mask, name) tuples, or [] when nothing arrived within timeout."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready: return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class FileCatalog:
+    """
+    In-memory view of the files shared from data_dir.
+
+    The directory is scanned once at start; afterwards the catalog is kept current
+    by inotify where available, with a periodic rescan-and-diff as fallback. LIST,
+    SEARCH and GET lookups are answered from memory without touching the disk.
+
+    Every change bumps version and is kept in a bounded history, so LIST can
+    answer "what changed since version N". A version reads "epoch:counter",
+    where epoch is drawn at random for each run and the counter starts at 0, so
+    a version from before a restart never matches one from after it, whatever
+    the clock did in between. etag is an order-independent fingerprint of every
+    (name, size, mtime) in the catalog.
+    """
+
+    def __init__(self, data_dir, rescan_interval=30, history=256):
+        self.data_dir = data_dir
+        self.rescan_interval = rescan_interval
+        self._entries = {}
+        self._sorted_names = None
+        self.epoch = os.urandom(4).hex()
+        self._counter = 0
+        self._history = deque(maxlen=history)   # (counter, added names, removed names, changed names)
+        self._fingerprint = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._running = False
+        self._thread = None
+        self._inotify = None
+
+    def start(self):
+        self.rescan()
+        self._loaded = True     # the initial scan is the baseline, not history
+        self._running = True
+        try:
+            self._inotify = _Inotify(self.data_dir)
+            target = self._inotify_loop
+            log.info(f"Catalog watching {self.data_dir} with inotify ({len(self._entries)} files).")
+        except (OSError, AttributeError) as e:
+            self._inotify = None
+            target = self._poll_loop
+            log.info(f"Catalog polling {self.data_dir} every {self.rescan_interval}s ({len(self._entries)} files): {e}")
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def add_listener(self, callback):
+        """Registers callback(added, removed, changed) invoked after every catalog change."""
+        self._listeners.append(callback)
+
+    # --- Lookups ---
+
+    def get(self, name):
+        with self._lock:
+            return self._entries.get(name)
+
+    def names(self):
+        with self._lock:
+            if self._sorted_names is None:
+                self._sorted_names = sorted(self._entries)
+            return list(self._sorted_names)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def version(self):
+        return f"{self.epoch}:{self._counter}"
+
+    @property
+    def etag(self):
+        with self._lock:
+            return f"{self._fingerprint:016x}"
+
+    def snapshot(self):
+        """(version, etag, sorted names), captured atomically."""
+        with self._lock:
+            if self._sorted_names is None:
+                self._sorted_names = sorted(self._entries)
+            return self.version, f"{self._fingerprint:016x}", list(self._sorted_names)
+
+    def changes_since(self, version):
+        """
+        (version, etag, added, removed, changed) name lists describing every
+        change after version, or None when version is from another run or
+        outside the history.
+        """
+        epoch, _, counter = str(version).partition(":")
+        if epoch != self.epoch or not counter.isdigit(): return None
+        counter = int(counter)
+        with self._lock:
+            if counter == self._counter:
+                return self.version, f"{self._fingerprint:016x}", [], [], []
+            if not self._history or counter < self._history[0][0] - 1 or counter > self._counter:
+                return None
+            # Whether each touched name existed at `version` follows from its first change after it
+            existed = {}
+            for change_counter, added, removed, changed in self._history:
+                if change_counter <= counter: continue
+                for name in added: existed.setdefault(name, False)
+                for name in removed: existed.setdefault(name, True)
+                for name in changed: existed.setdefault(name, True)
+            delta = ([], [], [])
+            for name, was_there in sorted(existed.items()):
+                is_there = name in self._entries
+                if is_there and not was_there: delta[0].append(name)
+                elif was_there and not is_there: delta[1].append(name)
+                elif was_there and is_there: delta[2].append(name)
+            return (self.version, f"{self._fingerprint:016x}") + delta
+
+    @staticmethod
+    def _entry_hash(entry):
+        ident = f"{entry.name}|{entry.size}|{entry.mtime_ns}".encode('utf-8')
+        return int.from_bytes(hashlib.sha256(ident).digest()[:8], 'big')
+
+    def _record(self, added, removed_entries, changed, old_changed):
+        # Caller holds self._lock; folds the change into etag, version and history
+        for entry in list(added) + list(removed_entries) + list(changed) + list(old_changed):
+            self._fingerprint ^= self._entry_hash(entry)
+        if not (added or removed_entries or changed): return
+        self._counter += 1
+        if self._loaded:
+            self._history.append((self._counter, [e.name for e in added],
+                                  [e.name for e in removed_entries], [e.name for e in changed]))
+
+    # --- Updates ---
+
+    def _stat_entry(self, name):
+        if not name or name.startswith('.'): return None
+        path = os.path.join(self.data_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode): return None
+        return CatalogEntry(name, path, st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def _scan(self):
+        entries = {}
+        try:
+            with os.scandir(self.data_dir) as it:
+                for dirent in it:
+                    if dirent.name.startswith('.'): continue
+                    try:
+                        if not dirent.is_file(): continue
+                        st = dirent.stat()
+                    except OSError:
+                        continue
+                    entries[dirent.name] = CatalogEntry(dirent.name, dirent.path, st.st_size, st.st_mtime_ns, st.st_ino)
+        except OSError as e:
+            log.error(f"Catalog scan of {self.data_dir} failed: {e}")
+            return None
+        return entries
+
+    def rescan(self):
+        """Full scandir of data_dir, diffed against the current catalog."""
+        scanned = self._scan()
+        if scanned is None: return
+        with self._lock:
+            current = self._entries
+            added = [e for n, e in scanned.items() if n not in current]
+            removed = [n for n in current if n not in scanned]
+            changed = [e for n, e in scanned.items() if n in current and current[n] != e]
+            self._record(added, [current[n] for n in removed], changed, [current[e.name] for e in changed])
+            self._entries = scanned
+            if added or removed:
+                self._sorted_names = None
+        self._notify(added, removed, changed)
+
+    def refresh(self, names):
+        """Re-stats only the given names (used for inotify events)."""
+        added, removed, changed = [], [], []
+        removed_entries, old_changed = [], []
+        with self._lock:
+            for name in names:
+                entry = self._stat_entry(name)
+                old = self._entries.get(name)
+                if entry is None:
+                    if old is not None:
+                        del self._entries[name]
+                        removed.append(name)
+                        removed_entries.append(old)
+                elif old is None:
+                    self._entries[name] = entry
+                    added.append(entry)
+                elif old != entry:
+                    self._entries[name] = entry
+                    changed.append(entry)
+                    old_changed.append(old)
+            self._record(added, removed_entries, changed, old_changed)
+            if added or removed:
+                self._sorted_names = None
+        self._notify(added, removed, changed)
+
+    def _notify(self, added, removed, changed):
+        if not (added or removed or changed): return
+        log.debug(f"Catalog update: +{len(added)} -{len(removed)} ~{len(changed)}")
+        for callback in list(self._listeners):
+            try:
+                callback(added, removed, changed)
+            except Exception as e:
+                log.error(f"Catalog listener error: {e}")
+
+    # --- Background watchers ---
+
+    def _poll_loop(self):
+        last_check = time.time()
+        while self._running:
+            time.sleep(0.5)
+            if time.time() - last_check < self.rescan_interval: continue
+            last_check = time.time()
+            self.rescan()
+
+    def _inotify_loop(self):
+        while self._running:
+            try:
+                events = self._inotify.read_events(timeout=1.0)
+            except OSError as e:
+                log.error(f"inotify read failed, falling back to polling: {e}")
+                self._poll_loop()
+                return
+            if not events: continue
+
+            # Coalesce bursts (e.g. a file being copied in) into one refresh
+            dirty = set()
+            full_rescan = False
+            deadline = time.time() + 2.0
+            while events:
+                for mask, name in events:
+                    if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF):
+                        full_rescan = True
+                    elif name:
+                        dirty.add(name)
+                if time.time() > deadline: break
+                events = self._inotify.read_events(timeout=0.2)
+
+            if full_rescan:
+                self.rescan()
+            elif dirty:
+                self.refresh(dirty)
@@ -8,7 +8,8 @@ from . import config as Cfg
 from . import identity as Id
 from . import server as Server
 from . import client as Client
-from .common import common_log, STATUS_OK
+from .mirror import DirectoryMirror, SYNC_UNCHANGED, SYNC_FAILED
+from .common import common_log, STATUS_OK, PROTOCOL_VERSION
 
 def _get_reticulum_config_file(config_dir):
     if config_dir:
@@ -132,8 +133,59 @@ def setup_logging(level_str='INFO'):
     if level > logging.DEBUG:
         logging.getLogger("RNS").setLevel(logging.WARNING)
 
+def run_federated_search(client):
+    q = input("Query: ")
+    def show_progress(server_info, response, merger):
+        if response.get("status") == STATUS_OK:
+            print(f"  {server_info['name']}: {len(response.get('results', []))} results")
+        else:
+            print(f"  {server_info['name']}: {response.get('message')}")
+    print("Searching all known servers...")
+    res = client.search_all(q, on_update=show_progress)
+    if res.get("status") != STATUS_OK:
+        print("Error:", res.get("message"))
+        return
+    results = res.get("results", [])
+    print(f"Results ({len(results)} unique files from {len(res.get('servers_answered', []))} servers):")
+    for r in results:
+        holders = ", ".join(s['name'] or s['hash'][:8] for s in r['servers'])
+        print(f"- {r['name']}  [{holders}]")
+
+def find_server(client, wanted, wait_sec):
+    """Waits up to wait_sec for a discovered server whose hash or name matches wanted."""
+    wanted = wanted.strip("<>").lower()
+    deadline = time.time() + wait_sec
+    while True:
+        for s in client.list_discovered_servers():
+            if s['hash'].strip("<>").lower().startswith(wanted) or s['name'].lower() == wanted:
+                return s
+        if time.time() >= deadline: return None
+        time.sleep(1)
+
+def run_sync(client, args):
+    """Mirrors one server's catalog into the download directory; returns the process exit code."""
+    server_info = find_server(client, args.server, args.wait)
+    if not server_info:
+        common_log.error(f"No server matching {args.server} was discovered within {args.wait}s.")
+        return 1
+    workers = args.jobs or client.client_config.get('sync_workers', 2)
+    print(f"Syncing {server_info['name']} into {client.download_dir} ({workers} parallel transfers)...")
+
+    def show_progress(name, outcome, message):
+        if outcome != SYNC_UNCHANGED:
+            print(f"  {outcome:9} {name}" + (f" ({message})" if message and outcome == SYNC_FAILED else ""))
+
+    res = DirectoryMirror(client, server_info, workers).run(on_file=show_progress)
+    counts = res.get("counts")
+    if counts:
+        print(f"{res['files']} files: {counts['new']} new, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged, {counts['failed']} failed ({res['elapsed']}s)")
+    else:
+        print("Error:", res.get("message"))
+    return 0 if res.get("status") == STATUS_OK else 1
+
 def run_client_interface(client):
-    print("\n--- Akita WAIS Client (v0.4.0) ---")
+    print(f"\n--- Akita WAIS Client (v{PROTOCOL_VERSION}) ---")
     selected_server = None
 
     while client.running:
@@ -145,9 +197,12 @@ def run_client_interface(client):
             print("3. Search Files")
             print("4. Get Peer List")
             print("5. Disconnect")
+            print("6. Search All Servers")
+            print("7. Swarm Download (all mirrors)")
         else:
             print("1. Discover Servers")
             print("2. Connect to Server")
+            print("3. Search All Servers")
         print("0. Exit")
         
         choice = input("> ")
@@ -168,8 +223,15 @@ def run_client_interface(client):
 
                 elif choice == "3":
                     q = input("Query: ")
-                    res = client.search_files(q)
-                    print("Results:", res.get("results", []))
+                    offset = 0
+                    while True:
+                        res = client.search_files(q, offset=offset)
+                        if res.get("status") != STATUS_OK:
+                            print("Error:", res.get("message"))
+                            break
+                        print(f"Results ({res.get('total', 0)} total):", res.get("results", []))
+                        offset = res.get("next_offset")
+                        if offset is None or input("More? [y/N] ").strip().lower() != "y": break
 
                 elif choice == "4":
                     res = client.get_peer_list()
@@ -181,6 +243,15 @@ def run_client_interface(client):
                     selected_server = None
                     # Client logic handles disconnection internally on next connect
 
+                elif choice == "6":
+                    run_federated_search(client)
+
+                elif choice == "7":
+                    fname = input("Filename: ")
+                    print("Looking for mirrors and downloading...")
+                    res = client.swarm_download(fname)
+                    print("Result:", res.get("message"))
+
             else:
                 if choice == "1":
                     servers = client.list_discovered_servers()
@@ -202,6 +273,9 @@ def run_client_interface(client):
                         else: print("Invalid number.")
                     except ValueError: print("Invalid input.")
 
+                elif choice == "3":
+                    run_federated_search(client)
+
             if choice == "0": 
                 client.stop()
                 break
@@ -222,9 +296,19 @@ def main():
 
     web_parser = subparsers.add_parser('web', help='Start WAIS Web UI Client')
 
+    sync_parser = subparsers.add_parser('sync', help="Mirror a server's files into a local directory")
+    sync_parser.add_argument('server', help='Server hash (or a prefix of it) or exact name')
+    sync_parser.add_argument('--dest', type=str, help='Local directory (default: client.download_dir)')
+    sync_parser.add_argument('--jobs', type=int, help='Parallel transfers (default: client.sync_workers)')
+    sync_parser.add_argument('--wait', type=int, default=30, help='Seconds to wait for the server to be discovered')
+
     args = parser.parse_args()
     config = Cfg.load_config(args.config)
     setup_logging(config['logging']['level'])
+    if args.mode == 'server' and args.no_announce:
+        config['server']['announce_interval_sec'] = 0
+    if args.mode == 'sync' and args.dest:
+        config['client']['download_dir'] = args.dest
 
     # Init RNS
     rns_config = config['reticulum'].get('config_dir')
@@ -277,6 +361,20 @@ def main():
             else:
                 common_log.error("Client start failed.")
 
+        elif args.mode == 'sync':
+            id_path = config['identity']['client_identity_path']
+            identity = Id.load_or_create_identity(id_path)
+            if not identity: sys.exit(1)
+
+            instance = Client.AkitaWAISClient(config, reticulum)
+            if not instance.start(identity):
+                common_log.error("Client start failed.")
+                sys.exit(1)
+            exit_code = run_sync(instance, args)
+            instance.stop()
+            instance = None
+            sys.exit(exit_code)
+
         elif args.mode == 'web':
             try:
                 from . import web_app
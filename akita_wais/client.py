@@ -1,17 +1,30 @@
 import RNS as R
+import io
 import os
 import json
 import time
 import threading
-import queue
-import pickle
-import zlib
+import fnmatch
+import hashlib
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from .common import (
     client_log as log, ASPECT_DISCOVERY, ASPECT_SERVICE,
     ACTION_LIST, ACTION_GET, ACTION_SEARCH, ACTION_PEER_LIST,
-    STATUS_OK, STATUS_ERROR, STATUS_FILE_META, calculate_sha256,
-    split_destination_name
+    ACTION_MANIFEST, ACTION_STAT, STATUS_OK, STATUS_ERROR, STATUS_FILE_META, STATUS_BUSY, CAP_RESOURCE, CAP_RANGE,
+    CAP_MUX, CAP_BINARY, CAP_STAT, CAP_DELTA, CAP_TAIL, MODE_RESOURCE, STREAM_HEADER, CHUNKED_LIST_VERSION, version_tuple,
+    announced_caps
 )
+from .streaming import FileReceiver
+from .resume import PartialDownload
+from .pool import LinkPool
+from . import wire
+from .federation import federated_search, iter_federated_search
+from .swarm import SwarmDownload, find_sources
+from .metacache import MetadataCache
+from .store import ContentStore
+from .compression import requestable_codecs
+from .peers import PeerRegistry
+from .delta import choose_block_size, signature, apply_delta
 
 class AkitaWAISClient:
     def __init__(self, config, reticulum_instance):
@@ -22,18 +35,43 @@ class AkitaWAISClient:
         self.identity = None
         self.announce_handler = None
         self.running = False
-        self.servers = {}
-        self.server_cache_path = self.client_config.get('server_cache_path', 'known_servers.cache')
+        self.servers = PeerRegistry(
+            self.client_config.get('server_cache_path', 'known_servers.db'),
+            ttl=self.client_config.get('peer_ttl_sec', 86400),
+            max_peers=self.client_config.get('peer_max', 1024)
+        )
+        self.download_dir = self.client_config.get('download_dir', '.')
+        self.store = ContentStore(self.client_config.get('store_dir', 'wais_store'))
         self._lock = threading.Lock()
-        self._active_link = None
-        self._response_queue = queue.Queue()
+        self._active_server = None      # default target for requests that do not name a server
+        self.pool = LinkPool(
+            self._configure_link, self._link_closed,
+            max_links=self.client_config.get('link_pool_size', 4),
+            idle_timeout=self.client_config.get('link_idle_sec', 300),
+            connect_timeout=self.client_config.get('request_timeout_sec', 20)
+        )
         self._file_transfer_state = {}
+        self._pending = {}          # request_id -> future, link and stream id of an in-flight request
+        self._streams = {}          # (link hash, stream id) -> request_id
+        self._early_data = {}       # (link hash, stream id) -> payloads that arrived before the file meta
+        self._stream_counter = 0
+        self._mux_links = set()
+        self._binary_links = set()  # links to servers that understand the binary wire encoding
+        self.metadata = MetadataCache(
+            self.client_config.get('metadata_cache_path', 'known_servers.meta.json'),
+            listing_ttl=self.client_config.get('listing_ttl_sec', 300),
+            search_ttl=self.client_config.get('search_ttl_sec', 120),
+            max_searches=self.client_config.get('search_cache_entries', 256)
+        )
 
     def start(self, identity):
         self.identity = identity
         if not self.identity: return False
-        self._load_server_cache()
+        os.makedirs(self.download_dir, exist_ok=True)
+        self.servers.load()
+        self.metadata.load()
         self._start_discovery_listener()
+        self.pool.start()
         self.running = True
         log.info("Akita WAIS Client Ready.")
         return True
@@ -41,22 +79,9 @@ class AkitaWAISClient:
     def stop(self):
         self.running = False
         if self.announce_handler: R.Transport.deregister_announce_handler(self.announce_handler)
-        if self._active_link and self._active_link.status != R.Link.CLOSED:
-            self._active_link.teardown()
-        self._save_server_cache()
-
-    def _load_server_cache(self):
-        if os.path.exists(self.server_cache_path):
-            try:
-                with open(self.server_cache_path, 'rb') as f:
-                    self.servers = pickle.load(f)
-            except Exception: self.servers = {}
-
-    def _save_server_cache(self):
-        try:
-            with open(self.server_cache_path, 'wb') as f:
-                with self._lock: pickle.dump(self.servers, f)
-        except Exception: pass
+        self.pool.close_all()
+        self.servers.close()
+        self.metadata.save()
 
     def _start_discovery_listener(self):
         # Access discovery aspect from app_config to avoid KeyError
@@ -78,161 +103,640 @@ class AkitaWAISClient:
         server_hash_hex = R.prettyhexrep(announced_identity.hash)
         try:
             info = json.loads(app_data.decode('utf-8'))
-            with self._lock:
-                self.servers[server_hash_hex] = {
-                    "name": info.get("name", f"Server {server_hash_hex[:6]}"),
-                    "description": info.get("desc", ""),
-                    "caps": info.get("caps", []),
-                    "hash": server_hash_hex,
-                    "last_seen": time.time()
-                }
+            self.servers.update(server_hash_hex, {
+                "name": info.get("name", f"Server {server_hash_hex[:6]}"),
+                "description": info.get("desc", ""),
+                "caps": announced_caps(info.get("v"), info.get("caps", [])),
+                "version": info.get("v"),
+                "fp": info.get("fp"),
+                "hash": server_hash_hex
+            })
         except Exception: pass
 
     def list_discovered_servers(self):
-        with self._lock:
-            if not self.servers: return []
-            sorted_servers = sorted(self.servers.items(), key=lambda item: item[1]['last_seen'], reverse=True)
-            return [info for _, info in sorted_servers]
+        """Servers heard from within peer_ttl_sec, most recently seen first."""
+        return self.servers.recent()
 
     def select_server(self, server_info):
-        server_hash_hex = server_info['hash']
-        if self._active_link and self._active_link.status != R.Link.CLOSED:
-            if R.prettyhexrep(self._active_link.destination.hash) == server_hash_hex: return True
-            self._active_link.teardown()
-
-        server_identity = R.Identity.recall(bytes.fromhex(server_hash_hex))
-        if not server_identity: return False
-
-        service_app_name, service_aspects = split_destination_name(ASPECT_SERVICE)
+        """Makes server_info the default target, connecting to it if it has no pooled link yet."""
+        with self.pool.lease(server_info) as link:
+            if link is None: return False
+        self._active_server = server_info
+        return True
 
-        server_destination = R.Destination(
-            server_identity, R.Destination.OUT, R.Destination.SINGLE,
-            service_app_name, *service_aspects
-        )
+    def _configure_link(self, link, server_info):
+        link.set_response_handler(self._handle_response)
+        link.set_data_handler(self._handle_data)
+        link.set_resource_strategy(R.Link.ACCEPT_ALL)
+        link.set_resource_started_callback(self._resource_started)
+        link.set_resource_concluded_callback(self._resource_concluded)
+        if CAP_MUX in server_info.get("caps", []):
+            self._mux_links.add(link.hash)
+        if CAP_BINARY in server_info.get("caps", []):
+            self._binary_links.add(link.hash)
 
-        log.info(f"Connecting to {server_info['name']}...")
-        self._active_link = R.Link(server_destination)
-        self._active_link.set_link_closed_callback(self._link_closed)
-        self._active_link.set_response_handler(self._handle_response)
-        self._active_link.set_data_handler(self._handle_data)
+    def _target(self, server):
+        """Server info for a request: an info dict, a server hash, or None for the selected server."""
+        if server is None: return self._active_server
+        if isinstance(server, dict): return server
+        return self.servers.get(server)
 
-        timeout = self.client_config.get('request_timeout_sec', 20)
-        start = time.time()
-        while self._active_link.status == R.Link.PENDING:
-            if time.time() - start > timeout:
-                self._active_link.teardown()
-                return False
-            time.sleep(0.1)
+    def _link_closed(self, link):
+        self._mux_links.discard(link.hash)
+        self._binary_links.discard(link.hash)
+        for rid in list(self._file_transfer_state.keys()):
+            state = self._file_transfer_state.get(rid)
+            if state and state['link_id'] == link.hash:
+                self._suspend_transfer(rid, state)
+        with self._lock:
+            orphaned = [rid for rid, p in self._pending.items() if p['link_id'] == link.hash]
+        for rid in orphaned:
+            self._resolve(rid, {"status": STATUS_ERROR, "message": "Link closed"})
 
-        return self._active_link.status == R.Link.ACTIVE
+    def _suspend_transfer(self, request_id, state):
+        """Keeps the bytes of an interrupted full-file transfer as a resumable partial download."""
+        receiver = state['receiver']
+        meta = state['meta']
+        tmp_path = None
+        if meta.get("offset") is None and receiver.written > 0:
+            tmp_path = receiver.suspend()
+        if tmp_path:
+            PartialDownload.from_interrupted(receiver.dest_path, tmp_path, meta)
+            self._fail_transfer(request_id, f"Link closed during transfer; {receiver.written} bytes kept for resume")
+        else:
+            receiver.abort()
+            self._fail_transfer(request_id, "Link closed during transfer")
 
-    def _link_closed(self, link):
-        if self._active_link == link:
-            self._active_link = None
-            for rid in list(self._file_transfer_state.keys()):
-                if self._file_transfer_state[rid]['link_id'] == link.hash:
-                    del self._file_transfer_state[rid]
+    def _resolve(self, request_id, response):
+        """Completes the future of a pending request and releases its stream id."""
+        with self._lock:
+            pending = self._pending.pop(request_id, None)
+            if pending and pending['sid'] is not None:
+                self._streams.pop((pending['link_id'], pending['sid']), None)
+                self._early_data.pop((pending['link_id'], pending['sid']), None)
+        if pending and not pending['future'].done():
+            pending['future'].set_result(response)
 
     def _handle_response(self, link, request_id, data):
         try:
-            response = json.loads(data.decode('utf-8'))
-            self._response_queue.put({"request_id": request_id, "response": response})
+            response = wire.loads(data)
 
-            if response.get("status") == STATUS_FILE_META:
-                filename = response.get("filename")
-                filesize = response.get("size")
+            if response.get("status") != STATUS_FILE_META:
+                # An error after the file meta (e.g. the resource could not be set up) ends that transfer
+                state = self._file_transfer_state.pop(request_id, None)
+                if state: state['receiver'].abort()
+                self._resolve(request_id, response)
+                return
+
+            filename = response.get("filename")
+            filesize = response.get("size")
+            if response.get("streamed"):
+                log.info(f"Receiving {filename} (streamed, {response.get('original_size')} bytes uncompressed)...")
+            else:
                 log.info(f"Receiving {filename} ({filesize} bytes)...")
-                
-                self._file_transfer_state[request_id] = {
-                    "filename": filename,
-                    "expected_size": filesize,
-                    "received_size": 0,
-                    "buffer": bytearray(), 
-                    "meta": response,
-                    "link_id": link.hash
-                }
+            
+            # Chunks go straight to a temp file; only ranged and delta GETs (bounded payloads) are buffered
+            sink = io.BytesIO() if response.get("offset") is not None or response.get("delta") else None
+            state = {
+                "filename": filename,
+                "receiver": FileReceiver(self.dest_path(filename), response, sink=sink),
+                "sink": sink,
+                "meta": response,
+                "mode": response.get("mode"),
+                "link_id": link.hash,
+                "last_activity": time.time()
+            }
+            with self._lock:
+                self._file_transfer_state[request_id] = state
+                early = self._early_data.pop((link.hash, response.get("sid")), [])
+
+            if state['receiver'].done:
+                self._finalize_file(request_id, state)  # empty file
+            for chunk in early:
+                self._feed_transfer(request_id, state, chunk)
         except Exception as e:
             log.error(f"Response error: {e}")
-            self._response_queue.put({"request_id": request_id, "response": {"status": STATUS_ERROR, "message": "Protocol Error"}})
+            self._resolve(request_id, {"status": STATUS_ERROR, "message": "Protocol Error"})
 
     def _handle_data(self, link, raw_data):
-        active_rid = None
-        for rid, state in self._file_transfer_state.items():
-            if state['link_id'] == link.hash:
-                active_rid = rid
-                break
-        
-        if not active_rid: return
+        if link.hash in self._mux_links:
+            # Framed: every packet starts with the stream id the client assigned to its request
+            if len(raw_data) < STREAM_HEADER.size: return
+            (sid,) = STREAM_HEADER.unpack_from(raw_data)
+            payload = raw_data[STREAM_HEADER.size:]
+            with self._lock:
+                active_rid = self._streams.get((link.hash, sid))
+                if active_rid is None: return
+                state = self._file_transfer_state.get(active_rid)
+                if state is None:
+                    # Data overtook the file meta response; hold it until the meta arrives
+                    self._early_data.setdefault((link.hash, sid), []).append(payload)
+                    return
+        else:
+            # Legacy servers: unframed data belongs to the single transfer on this link
+            payload = raw_data
+            active_rid = None
+            for rid, state in list(self._file_transfer_state.items()):
+                if state['link_id'] == link.hash and state['mode'] != MODE_RESOURCE:
+                    active_rid = rid
+                    break
+            if not active_rid: return
 
-        state = self._file_transfer_state[active_rid]
-        state['buffer'].extend(raw_data)
-        state['received_size'] += len(raw_data)
-        
-        if state['received_size'] >= state['expected_size']:
-            self._finalize_file(active_rid, state)
+        self._feed_transfer(active_rid, state, payload)
+
+    def _feed_transfer(self, request_id, state, payload):
+        receiver = state['receiver']
+        state['last_activity'] = time.time()
+        try:
+            receiver.feed(payload)
+        except Exception as e:
+            receiver.abort()
+            self._fail_transfer(request_id, str(e))
+            return
+
+        if receiver.done:
+            self._finalize_file(request_id, state)
+
+    def _resource_started(self, resource):
+        # Resource metadata only arrives with the data, so progress is attached to the
+        # oldest resource-mode transfer on the link that has no resource yet
+        for state in list(self._file_transfer_state.values()):
+            if state['link_id'] == resource.link.hash and state['mode'] == MODE_RESOURCE and state.get('resource') is None:
+                state['resource'] = resource
+                return
+
+    def _resource_concluded(self, resource):
+        metadata = resource.metadata or {}
+        rid = metadata.get("rid")
+        state = self._file_transfer_state.get(rid)
+        if not state:
+            log.warning(f"Received resource for unknown request {rid}")
+            return
+        if resource.status != R.Resource.COMPLETE:
+            state['receiver'].abort()
+            self._fail_transfer(rid, "Resource transfer failed")
+            return
+
+        # resource.data is only valid during this callback; copy it through the receiver now
+        receiver = state['receiver']
+        try:
+            for chunk in iter(lambda: resource.data.read(65536), b""):
+                receiver.feed(chunk)
+        except Exception as e:
+            receiver.abort()
+            self._fail_transfer(rid, str(e))
+            return
+        self._finalize_file(rid, state)
+
+    def _fail_transfer(self, request_id, message):
+        log.error(f"File transfer failed: {message}")
+        self._file_transfer_state.pop(request_id, None)
+        self._resolve(request_id, {"status": STATUS_ERROR, "message": message})
 
     def _finalize_file(self, request_id, state):
         try:
-            data = state['buffer']
-            meta = state['meta']
             filename = state['filename']
+            log.info("Verifying integrity...")
+            size = state['receiver'].finalize()
+            log.info("Integrity Verified (SHA256).")
 
-            # Decompression
-            if meta.get('compressed', False):
-                try:
-                    log.info("Decompressing data...")
-                    final_data = zlib.decompress(data)
-                except zlib.error:
-                    raise Exception("Decompression failed. Data corrupted.")
-            else:
-                final_data = data
-
-            # Integrity Check
-            if 'sha256' in meta:
-                log.info("Verifying integrity...")
-                calculated_hash = calculate_sha256(final_data)
-                if calculated_hash != meta['sha256']:
-                    raise Exception(f"Integrity Mismatch! Server: {meta['sha256']}, Recv: {calculated_hash}")
-                log.info("Integrity Verified (SHA256).")
-
-            # Save
-            with open(filename, 'wb') as f:
-                f.write(final_data)
+            if state['sink'] is not None:
+                # Ranged or delta GET: hand the bytes back to the resume or delta logic
+                self._resolve(request_id, dict(state['meta'], status=STATUS_OK, data=state['sink'].getvalue()))
+                return
             
-            log.info(f"Saved {filename} ({len(final_data)} bytes).")
-            self._response_queue.put({"request_id": request_id, "response": {"status": STATUS_OK, "message": f"File {filename} received & verified."}})
+            log.info(f"Saved {filename} ({size} bytes).")
+            self.store.add(state['receiver'].dest_path, state['receiver'].sha256)
+            self._resolve(request_id, {"status": STATUS_OK, "message": f"File {filename} received & verified."})
 
         except Exception as e:
             log.error(f"File verification/save failed: {e}")
-            self._response_queue.put({"request_id": request_id, "response": {"status": STATUS_ERROR, "message": str(e)}})
+            self._resolve(request_id, {"status": STATUS_ERROR, "message": str(e)})
         
         finally:
-            if request_id in self._file_transfer_state:
-                del self._file_transfer_state[request_id]
+            self._file_transfer_state.pop(request_id, None)
 
-    def _send_request_and_wait(self, request):
-        if not self._active_link: return {"status": STATUS_ERROR, "message": "Not connected"}
-        
+    def _next_stream_id(self, link):
+        # Caller holds self._lock
+        for _ in range(0xFFFF):
+            self._stream_counter = self._stream_counter % 0xFFFF + 1
+            if (link.hash, self._stream_counter) not in self._streams:
+                return self._stream_counter
+        raise Exception("No free stream ids on link")
+
+    def _send_request_and_wait(self, request, server=None, timeout=None):
+        server_info = self._target(server)
+        if not server_info: return {"status": STATUS_ERROR, "message": "Not connected"}
+
+        # A busy server names its own back-off; honour it as long as the wait stays reasonable
+        max_wait = self.client_config.get('busy_max_wait_sec', 30)
+        while True:
+            # The lease keeps the pooled link from being closed as idle while the request is in flight
+            with self.pool.lease(server_info) as link:
+                if link is None: return {"status": STATUS_ERROR, "message": f"Could not reach {server_info.get('name', server_info['hash'])}"}
+                response = self._request_on_link(link, request, timeout)
+            if response.get("status") != STATUS_BUSY: return response
+            retry_after = response.get("retry_after", max_wait + 1)
+            if retry_after > max_wait: return response
+            max_wait -= retry_after
+            log.info(f"{server_info.get('name')} is busy; retrying in {retry_after}s")
+            time.sleep(retry_after)
+
+    def _start_request(self, link, request):
+        """Sends request on link and returns (request_id, future) for its response."""
+        future = Future()
+        with self._lock:
+            # Registered under the lock so responses and data for this request cannot be missed
+            sid = None
+            if request.get("action") == ACTION_GET and link.hash in self._mux_links:
+                sid = self._next_stream_id(link)
+                request = dict(request, sid=sid)
+            req_id = link.request(wire.dumps(request, binary=link.hash in self._binary_links))
+            self._pending[req_id] = {"future": future, "link_id": link.hash, "sid": sid}
+            if sid is not None:
+                self._streams[(link.hash, sid)] = req_id
+        return req_id, future
+
+    def _transfer_progressing(self, request_id, timeout):
+        """True while the transfer answering request_id is still moving; transfers only time out once they stall."""
+        state = self._file_transfer_state.get(request_id)
+        return bool(state) and (state['mode'] == MODE_RESOURCE or time.time() - state['last_activity'] < timeout)
+
+    def _abandon_request(self, request_id):
+        state = self._file_transfer_state.pop(request_id, None)
+        if state: state['receiver'].abort()
+        self._resolve(request_id, None)
+
+    def _request_on_link(self, link, request, timeout=None):
         try:
-            req_id = self._active_link.request(json.dumps(request).encode('utf-8'))
-            timeout = self.client_config.get('request_timeout_sec', 30)
-            start = time.time()
-            
+            req_id, future = self._start_request(link, request)
+            timeout = timeout or self.client_config.get('request_timeout_sec', 30)
             while True:
                 try:
-                    item = self._response_queue.get(timeout=0.5)
-                    if item['request_id'] == req_id:
-                        resp = item['response']
-                        if resp.get("status") == STATUS_FILE_META:
-                            continue # Keep waiting for final
-                        return resp
-                except queue.Empty:
-                    if time.time() - start > timeout:
-                        return {"status": STATUS_ERROR, "message": "Timeout"}
+                    return future.result(timeout=timeout)
+                except FutureTimeout:
+                    if self._transfer_progressing(req_id, timeout): continue
+                    self._abandon_request(req_id)
+                    return {"status": STATUS_ERROR, "message": "Timeout"}
         except Exception as e:
             return {"status": STATUS_ERROR, "message": str(e)}
 
-    def get_server_list(self): return self._send_request_and_wait({"action": ACTION_LIST})
-    def get_file(self, filename): return self._send_request_and_wait({"action": ACTION_GET, "filename": filename})
-    def search_files(self, query): return self._send_request_and_wait({"action": ACTION_SEARCH, "query": query})
-    def get_peer_list(self): return self._send_request_and_wait({"action": ACTION_PEER_LIST})
+    def dest_path(self, filename):
+        """Local path a download of filename is saved to."""
+        return os.path.join(self.download_dir, os.path.basename(filename))
+
+    def transfer_progress(self):
+        """Snapshot of in-flight transfers: bytes received so far against the original size."""
+        progress = []
+        for state in list(self._file_transfer_state.values()):
+            meta = state['meta']
+            total = meta.get('original_size') or meta.get('size') or 0
+            resource = state.get('resource')
+            done = int(resource.get_progress() * total) if resource is not None else state['receiver'].written
+            progress.append({
+                "filename": state['filename'],
+                "dest_path": state['receiver'].dest_path,
+                "ranged": meta.get("offset") is not None,
+                "bytes": min(done, total) if total else done,
+                "total": total
+            })
+        return progress
+
+    def iter_server_list(self, server=None, since_version=None):
+        """
+        Yields the server's file list chunk by chunk (one chunk holding everything
+        from pre-0.5 servers). With since_version, a server that still has that
+        version in its history answers with a single delta response instead.
+        """
+        request = {"action": ACTION_LIST}
+        if since_version is not None: request["since_version"] = since_version
+        if not self._protocol_at_least(CHUNKED_LIST_VERSION, server):
+            yield self._send_request_and_wait(request, server)
+            return
+        offset = 0
+        while offset is not None:
+            res = self._send_request_and_wait(dict(request, offset=offset), server)
+            yield res
+            if res.get("status") != STATUS_OK or "added" in res: return
+            offset = res.get("next_offset")
+
+    def get_server_list(self, server=None):
+        """
+        The server's file list. A list fetched within listing_ttl_sec is answered
+        from the metadata cache ("cached": true). After that, the client asks only
+        for what changed since the held catalog version; the response then also
+        carries the added, removed and changed names.
+        """
+        server_info = self._target(server)
+        if not server_info: return {"status": STATUS_ERROR, "message": "Not connected"}
+        cached = self._cached_listing(server_info)
+        if cached: return cached
+        chunks = []
+        for res in self.iter_server_list(server_info, since_version=self._listing_version(server_info)):
+            if res.get("status") != STATUS_OK: return res
+            chunks.append(res)
+        return self._merge_listing(server_info, chunks)
+
+    def _fingerprint_matches(self, server_info, etag):
+        """True when the server's recent announce carries the fingerprint of the catalog etag a cached answer was given under."""
+        latest = self.servers.get(server_info["hash"]) or server_info
+        # A catalog change is announced at once, but an announce can be missed; old ones vouch for nothing
+        if time.time() - latest.get("last_seen", 0) > self.client_config.get('fingerprint_max_age_sec', 1800): return False
+        return bool(etag and latest.get("fp")) and etag.startswith(latest["fp"])
+
+    def _cached_listing(self, server_info):
+        held, fresh = self.metadata.listing(server_info["hash"])
+        # Past the TTL, an announce fingerprint matching the held etag still vouches for the list
+        if not held or not (fresh or self._fingerprint_matches(server_info, held["etag"])): return None
+        return {"status": STATUS_OK, "files": held["files"], "version": held["version"], "etag": held["etag"], "cached": True}
+
+    def _listing_version(self, server_info):
+        held, _ = self.metadata.listing(server_info["hash"])
+        return held["version"] if held else None
+
+    def _merge_listing(self, server_info, chunks):
+        """Turns LIST responses (snapshot chunks or one delta) into the full list and remembers it."""
+        key = server_info["hash"]
+        held, _ = self.metadata.listing(key)
+        files, delta = [], None
+        version, etag = chunks[0].get("version"), chunks[0].get("etag")
+        for res in chunks:
+            if "added" in res:
+                delta = {k: res.get(k, []) for k in ("added", "removed", "changed")}
+                gone = set(delta["removed"])
+                files = sorted(set(n for n in (held["files"] if held else []) if n not in gone) | set(delta["added"]))
+            else:
+                files.extend(res.get("files", []))
+            # A snapshot walked while the catalog changed may have skipped names as offsets shifted
+            if res.get("version") != version: version = None
+        if delta is None and version is None: files = sorted(set(files))
+
+        # Without a version (pre-delta server, or a torn walk) the next call fetches a full snapshot
+        if version is not None:
+            self.metadata.put_listing(key, version, etag, files)
+        else:
+            self.metadata.drop_listing(key)
+        response = {"status": STATUS_OK, "files": files, "version": version, "etag": etag}
+        if delta is not None: response.update(delta)
+        return response
+
+    def _server_supports(self, cap, server=None):
+        server_info = self._target(server)
+        return bool(server_info) and cap in server_info.get("caps", [])
+
+    def _protocol_at_least(self, version, server=None):
+        server_info = self._target(server)
+        return bool(server_info) and version_tuple(server_info.get("version")) >= version_tuple(version)
+
+    def stat_file(self, filename, server=None):
+        """Size, mtime and SHA-256 of filename on the server, without transferring it."""
+        return self._send_request_and_wait({"action": ACTION_STAT, "filename": filename}, server)
+
+    def _wants_stat(self, server=None):
+        # A stat round trip only pays off when the store could hold the answer
+        return len(self.store) > 0 and self._server_supports(CAP_STAT, server)
+
+    def _place_from_store(self, filename, stat):
+        """Puts filename in place from the content store when stat names content held locally; the response, or None."""
+        if stat.get("status") != STATUS_OK or not stat.get("sha256"): return None
+        dest_path = self.dest_path(filename)
+        if not self.store.place(stat["sha256"], dest_path, stat.get("size")): return None
+        partial = PartialDownload.load(dest_path)
+        if partial: partial.discard()
+        log.info(f"{filename} already held locally ({stat['sha256'][:16]}); no transfer needed.")
+        return {"status": STATUS_OK, "message": f"File {filename} placed from local store.", "deduplicated": True}
+
+    def get_file(self, filename, resume=True, server=None, tail=None, stat=None):
+        """
+        Downloads filename. An older local copy is brought up to date with a
+        tail GET (when tail is set, or by default for names matching
+        client.tail_patterns) or a block delta; anything else is fetched whole.
+        A STAT response the caller already holds for filename can be passed as
+        stat to save asking again.
+        """
+        if stat is None and self._wants_stat(server):
+            stat = self.stat_file(filename, server)
+        if stat is not None:
+            placed = self._place_from_store(filename, stat)
+            if placed: return placed
+
+        partial = PartialDownload.load(self.dest_path(filename))
+        if partial:
+            if resume and self._server_supports(CAP_RANGE, server):
+                return self._resume_file(filename, partial, server)
+            partial.discard()
+
+        if self._wants_tail(filename, tail, server):
+            block_size, request = self._tail_request(filename, server)
+        elif self._wants_delta(filename, server):
+            block_size, request = self._delta_request(filename, server)
+        elif self._server_supports(CAP_RESOURCE, server) and self._server_supports(CAP_RANGE, server):
+            return self._get_in_ranges(filename, server)
+        else:
+            return self._send_request_and_wait(self._get_request(filename, server), server)
+        return self._apply_delta(filename, block_size, self._send_request_and_wait(request, server))
+
+    def _wants_tail(self, filename, tail=None, server=None):
+        if tail is None:
+            tail = any(fnmatch.fnmatch(filename, p) for p in self.client_config.get('tail_patterns', []))
+        dest_path = self.dest_path(filename)
+        return bool(tail) and self._server_supports(CAP_TAIL, server) and os.path.isfile(dest_path) and os.path.getsize(dest_path) > 0
+
+    def _tail_request(self, filename, server=None):
+        """(length of the local copy, GET request asking only for what was appended after it)."""
+        sha256_hash = hashlib.sha256()
+        length = 0
+        with open(self.dest_path(filename), 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                sha256_hash.update(chunk)
+                length += len(chunk)
+        return length, self._get_request(filename, server, tail={"length": length, "sha256": sha256_hash.hexdigest()})
+
+    def _wants_delta(self, filename, server=None):
+        # An older local copy worth describing by signature instead of fetching the file whole
+        dest_path = self.dest_path(filename)
+        min_bytes = self.client_config.get('delta_min_kb', 64) * 1024
+        return self._server_supports(CAP_DELTA, server) and os.path.isfile(dest_path) and os.path.getsize(dest_path) >= min_bytes
+
+    def _delta_request(self, filename, server=None):
+        """(block size, GET request carrying the signature of the local copy of filename)."""
+        block_size = choose_block_size(os.path.getsize(self.dest_path(filename)))
+        return block_size, self._get_request(filename, server, delta=signature(self.dest_path(filename), block_size))
+
+    def _apply_delta(self, filename, block_size, response):
+        """Rebuilds filename from its local copy and a delta or tail response; other responses (a whole-file fallback) pass through."""
+        if response.get("status") != STATUS_OK or not response.get("delta"): return response
+        dest_path = self.dest_path(filename)
+        try:
+            size = apply_delta(dest_path, response["data"], block_size, dest_path, response["file_sha256"])
+        except Exception as e:
+            log.error(f"Delta update of {filename} failed: {e}")
+            return {"status": STATUS_ERROR, "message": str(e)}
+        self.store.add(dest_path, response["file_sha256"])
+        kind = "tail" if response.get("tail") else "delta"
+        log.info(f"Updated {filename} ({size} bytes) from a {response.get('size')} byte {kind}.")
+        return {"status": STATUS_OK, "message": f"File {filename} updated & verified ({kind})."}
+
+    def _get_request(self, filename, server=None, **fields):
+        # stream: this client can receive unsized transfers whose digest follows as a trailer
+        request = dict({"action": ACTION_GET, "filename": filename, "stream": True}, **fields)
+        # Prefer RNS Resources (windowed, retransmitted) when the server supports them
+        if self._server_supports(CAP_RESOURCE, server):
+            request["mode"] = MODE_RESOURCE
+        server_info = self._target(server)
+        codecs = requestable_codecs(server_info.get("caps", [])) if server_info else []
+        if codecs: request["codecs"] = codecs
+        return request
+
+    def get_manifest(self, filename, server=None, timeout=None):
+        return self._send_request_and_wait({"action": ACTION_MANIFEST, "filename": filename}, server, timeout)
+
+    def _fetch_range(self, server, filename, offset, length, timeout=None):
+        return self._send_request_and_wait(self._get_request(filename, server, offset=offset, length=length), server, timeout)
+
+    def _get_in_ranges(self, filename, server=None, timeout=None):
+        """
+        Whole-file GET in resource mode. A Resource hands over its bytes only
+        when it concludes, so an interrupted one leaves nothing to resume; the
+        file is fetched as ranges of resume_range_kb instead, each written to
+        the partial download as it arrives. A file that fits in the first range
+        costs no more round trips than a plain GET.
+        """
+        max_range = self.client_config.get('resume_range_kb', 1024) * 1024
+        first = self._fetch_range(server, filename, 0, max_range, timeout)
+        if first.get("status") != STATUS_OK: return first
+        dest_path = self.dest_path(filename)
+        if first["length"] >= first["file_size"]:
+            # The range is the whole file, and its SHA-256 was verified on receipt
+            tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(first["data"])
+            os.replace(tmp_path, dest_path)
+            self.store.add(dest_path, first["sha256"])
+            log.info(f"Saved {filename} ({first['length']} bytes).")
+            return {"status": STATUS_OK, "message": f"File {filename} received & verified."}
+
+        manifest = self.get_manifest(filename, server, timeout)
+        if manifest.get("status") != STATUS_OK: return manifest
+        partial = PartialDownload(dest_path)
+        partial.adopt_manifest(manifest)
+        # Only whole blocks can be verified; the tail of the first range is fetched again with the next one
+        whole = len(first["data"]) - len(first["data"]) % manifest["block_size"]
+        partial.write_range(0, first["data"][:whole])
+        return self._fetch_missing(filename, partial, server, timeout)
+
+    def _resume_file(self, filename, partial, server=None, timeout=None):
+        """Fetches only the blocks of a partial download that are missing or fail verification."""
+        manifest = self.get_manifest(filename, server, timeout)
+        if manifest.get("status") != STATUS_OK: return manifest
+        partial.adopt_manifest(manifest)
+        log.info(f"Resuming {filename}: {len(partial.state['verified'])}/{len(manifest['blocks'])} blocks already verified.")
+        return self._fetch_missing(filename, partial, server, timeout)
+
+    def _fetch_missing(self, filename, partial, server=None, timeout=None):
+        max_range = self.client_config.get('resume_range_kb', 1024) * 1024
+        for _ in range(3):
+            ranges = partial.missing_ranges(max_range)
+            if not ranges: break
+            for offset, length in ranges:
+                res = self._fetch_range(server, filename, offset, length, timeout)
+                if res.get("status") != STATUS_OK:
+                    return {"status": STATUS_ERROR, "message": f"Resume interrupted ({res.get('message')}); partial download kept."}
+                bad = partial.write_range(res["offset"], res["data"])
+                if bad: log.warning(f"{bad} blocks of {filename} failed verification; refetching.")
+
+        return self._finish_partial(filename, partial)
+
+    def _finish_partial(self, filename, partial):
+        if not partial.complete:
+            return {"status": STATUS_ERROR, "message": "Could not verify all blocks; partial download kept."}
+        try:
+            size = partial.finish()
+        except Exception as e:
+            return {"status": STATUS_ERROR, "message": str(e)}
+        self.store.add(partial.dest_path, partial.state["sha256"])
+        log.info(f"Saved {filename} ({size} bytes).")
+        return {"status": STATUS_OK, "message": f"File {filename} received & verified."}
+
+    def swarm_download(self, filename, server=None, max_sources=None):
+        """
+        Downloads filename in parallel from every discovered server holding the
+        same content (matched by SHA-256), starting from server's manifest.
+        """
+        primary = self._target(server)
+        if not primary: return {"status": STATUS_ERROR, "message": "Not connected"}
+        if not self._server_supports(CAP_RANGE, primary):
+            return self.get_file(filename, server=primary)
+
+        manifest = self.get_manifest(filename, primary)
+        if manifest.get("status") != STATUS_OK: return manifest
+        placed = self._place_from_store(filename, manifest)
+        if placed: return placed
+        dest_path = self.dest_path(filename)
+        partial = PartialDownload.load(dest_path) or PartialDownload(dest_path)
+        partial.adopt_manifest(manifest)
+
+        max_sources = max_sources or self.client_config.get('swarm_max_sources', 4)
+        sources = find_sources(self, filename, manifest, primary, max_sources)
+        range_bytes = self.client_config.get('swarm_range_kb', 256) * 1024
+        for _ in range(3):
+            if partial.complete: break
+            swarm = SwarmDownload(self._fetch_range, partial, sources, range_bytes)
+            swarm.run()
+        return self._finish_partial(filename, partial)
+
+    def search_files(self, query, offset=0, limit=None, server=None, digests=False):
+        request = self._search_request(query, offset, limit, digests)
+        server_info = self._target(server)
+        if not server_info: return {"status": STATUS_ERROR, "message": "Not connected"}
+        cached, send = self._search_plan(server_info, request)
+        if cached: return cached
+        return self._search_result(server_info, request, self._send_request_and_wait(send, server_info))
+
+    @staticmethod
+    def _search_request(query, offset=0, limit=None, digests=False):
+        request = {"action": ACTION_SEARCH, "query": query, "offset": offset}
+        if limit: request["limit"] = limit
+        if digests: request["digests"] = True
+        return request
+
+    def _search_plan(self, server_info, request):
+        """(cached response to return now or None, request to send): stale results go out with their etag for revalidation."""
+        cached, fresh = self.metadata.search(server_info["hash"], request)
+        if cached is None: return None, request
+        if fresh or self._fingerprint_matches(server_info, cached.get("etag")): return dict(cached, cached=True), None
+        return None, dict(request, etag=cached["etag"]) if cached.get("etag") else request
+
+    def _search_result(self, server_info, request, response):
+        if response.get("status") != STATUS_OK: return response
+        if response.get("unchanged"):
+            cached, _ = self.metadata.search(server_info["hash"], request)
+            if cached is not None:
+                self.metadata.touch_search(server_info["hash"], request)
+                return dict(cached, cached=True)
+            return response
+        # Servers without catalog etags cannot revalidate; their results still serve within the TTL
+        self.metadata.put_search(server_info["hash"], request, response)
+        return response
+
+    def federation_targets(self, top_n=None):
+        """Servers a federated search fans out to: pooled (already linked) servers first, then most recently seen."""
+        top_n = top_n or self.client_config.get('federated_max_servers', 8)
+        servers = self.list_discovered_servers()
+        servers.sort(key=lambda s: not self.pool.is_connected(s['hash']))
+        return servers[:top_n]
+
+    def iter_search_all(self, query, top_n=None, deadline=None, limit=None):
+        """Yields (server_info, response) as each server answers a federated search."""
+        deadline = deadline or self.client_config.get('federated_deadline_sec', 15)
+        return iter_federated_search(self, query, self.federation_targets(top_n), deadline, limit)
+
+    def search_all(self, query, top_n=None, deadline=None, limit=None, on_update=None):
+        """Searches all (or the top_n) known servers in parallel and merges the answers by content digest."""
+        targets = self.federation_targets(top_n)
+        if not targets: return {"status": STATUS_ERROR, "message": "No servers discovered"}
+        deadline = deadline or self.client_config.get('federated_deadline_sec', 15)
+        return federated_search(self, query, targets, deadline, limit, on_update)
+
+    def get_peer_list(self, server=None):
+        return self._send_request_and_wait({"action": ACTION_PEER_LIST}, server)
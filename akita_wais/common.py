@@ -1,9 +1,10 @@
 import logging
 import hashlib
+import struct
 import zlib
 
 # Protocol Version
-PROTOCOL_VERSION = "0.4.0"
+PROTOCOL_VERSION = "0.6.0"
 
 # Reticulum Aspects
 ASPECT_DISCOVERY = "akita.wais.discovery.v1"
@@ -19,15 +20,54 @@ ACTION_LIST = "list"
 ACTION_GET = "get"
 ACTION_SEARCH = "search"
 ACTION_PEER_LIST = "peer_list"
+ACTION_MANIFEST = "manifest"
+ACTION_STAT = "stat"        # metadata only: size, mtime and full SHA-256 of one file
 
 # Status codes
 STATUS_OK = "ok"
 STATUS_ERROR = "error"
 STATUS_FILE_META = "file_meta"
+STATUS_BUSY = "busy"        # transfer queue full; response carries retry_after (seconds)
+
+# Capabilities advertised in the announce "caps" list
+CAP_ZLIB = "zlib"
+CAP_SHA256 = "sha256"
+CAP_RESOURCE = "resource"
+CAP_RANGE = "range"
+CAP_MUX = "mux"
+CAP_BINARY = "bin1"     # compact binary message encoding (wire.py), protocol 0.5.0+
+CAP_STAT = "stat"
+CAP_BZ2 = "bz2"         # payload codecs beyond zlib (compression.py); kept short for the announce budget
+CAP_LZMA = "xz"
+CAP_DELTA = "delta"     # GET with a block signature answers with an rsync-style delta (delta.py)
+CAP_TAIL = "tail"       # GET with the length and SHA-256 of a local prefix answers with the appended bytes
+SERVER_CAPS = [CAP_ZLIB, CAP_SHA256, CAP_RESOURCE, CAP_RANGE, CAP_MUX, CAP_BINARY, CAP_STAT, CAP_BZ2, CAP_LZMA, CAP_DELTA, CAP_TAIL]
+
+# Every server from protocol 0.6.0 on has these caps, so its announce lists only
+# caps beyond them; that leaves room for the catalog fingerprint in MAX_ANNOUNCE_SIZE
+BASELINE_CAPS_VERSION = "0.6.0"
+BASELINE_CAPS = [CAP_ZLIB, CAP_SHA256, CAP_RESOURCE, CAP_RANGE, CAP_MUX, CAP_BINARY, CAP_STAT, CAP_BZ2, CAP_LZMA, CAP_DELTA, CAP_TAIL]
+
+# Hex digits of the catalog etag carried in announces as "fp"
+ANNOUNCE_FINGERPRINT_HEX = 8
+
+# ACTION_GET transfer modes
+MODE_PACKETS = "packets"    # MDU-sized link packets, no retransmission
+MODE_RESOURCE = "resource"  # RNS.Resource: windowed, segmented, retransmitted
+
+# Data packet framing on multiplexed ("mux") links: stream id chosen by the client
+STREAM_HEADER = struct.Struct(">H")
+
+# Search results carry this many hex digits of each file's SHA-256 when asked for digests
+SEARCH_DIGEST_HEX = 16
+
+# First protocol version whose LIST accepts offset/max_bytes and answers in chunks
+CHUNKED_LIST_VERSION = "0.5.0"
 
 # Configuration Constants
 MAX_ANNOUNCE_SIZE = 128
 MAX_TRANSFER_RAM = 20 * 1024 * 1024  # 20MB limit for in-memory compression
+BLOCK_DIGEST_BYTES = 16  # Truncated SHA-256 per manifest block; the full-file SHA-256 is still checked
 
 def split_destination_name(destination_name):
     parts = destination_name.split('.')
@@ -35,8 +75,24 @@ def split_destination_name(destination_name):
         return destination_name, ()
     return parts[0], tuple(parts[1:])
 
+def version_tuple(version):
+    """Parses "0.5.0" into (0, 5, 0); unknown or malformed versions sort before everything."""
+    try:
+        return tuple(int(part) for part in str(version).split("."))
+    except ValueError:
+        return (0,)
+
+def announced_caps(version, caps):
+    """A server's full capability list: those its protocol version implies plus those its announce lists."""
+    implied = BASELINE_CAPS if version_tuple(version) >= version_tuple(BASELINE_CAPS_VERSION) else []
+    return implied + [c for c in caps or [] if c not in implied]
+
 def calculate_sha256(data_bytes):
     """Helper to calculate SHA256 hash of bytes for integrity verification."""
     sha256_hash = hashlib.sha256()
     sha256_hash.update(data_bytes)
     return sha256_hash.hexdigest()
+
+def block_digest(data_bytes):
+    """Per-block digest used in chunk manifests."""
+    return hashlib.sha256(data_bytes).digest()[:BLOCK_DIGEST_BYTES].hex()
@@ -0,0 +1,110 @@
+import bz2
+import lzma
+import time
+import zlib
+from .common import CAP_ZLIB, CAP_BZ2, CAP_LZMA
+
+# Codec registry for file payloads.
+#
+# A payload's meta names its codec ("codec"); "compressed": true without one
+# means zlib, which every peer decodes. bz2 and lzma are used only when the
+# receiver lists them in the GET request's "codecs" (clients send the names
+# of every codec they can decode). Servers advertise the short caps below so
+# clients know which names are worth asking for.
+
+
+class Codec:
+    def __init__(self, name, cap, compressobj, decompressobj):
+        self.name = name
+        self.cap = cap
+        self.compressobj = compressobj      # () -> object with compress(data) and flush()
+        self.decompressobj = decompressobj  # () -> object with decompress(data), eof and unused_data
+
+    def compress(self, data):
+        compressor = self.compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+
+CODECS = {
+    "zlib1": Codec("zlib1", CAP_ZLIB, lambda: zlib.compressobj(1), zlib.decompressobj),
+    "zlib6": Codec("zlib6", CAP_ZLIB, lambda: zlib.compressobj(6), zlib.decompressobj),
+    "zlib9": Codec("zlib9", CAP_ZLIB, lambda: zlib.compressobj(9), zlib.decompressobj),
+    "bz2": Codec("bz2", CAP_BZ2, lambda: bz2.BZ2Compressor(9), bz2.BZ2Decompressor),
+    "lzma": Codec("lzma", CAP_LZMA, lambda: lzma.LZMACompressor(preset=6), lzma.LZMADecompressor),
+}
+
+# What "compressed": true means when the meta names no codec (pre-registry peers)
+DEFAULT_CODEC = "zlib6"
+LEGACY_CODECS = ["zlib1", "zlib6", "zlib9"]
+
+CODEC_CAPS = [CAP_BZ2, CAP_LZMA]
+
+# A codec has to beat this ratio on the sample before it is worth the CPU at all
+MIN_RATIO = 0.9
+
+
+def get_codec(name):
+    codec = CODECS.get(name or DEFAULT_CODEC)
+    if codec is None: raise ValueError(f"Unknown codec {name}")
+    return codec
+
+
+def accepted_codecs(names):
+    """Codecs a receiver that listed names in its request can decode; zlib always."""
+    return LEGACY_CODECS + [n for n in (names or []) if n in CODECS and n not in LEGACY_CODECS]
+
+
+def _sample_offsets(size, sample_bytes, samples):
+    return [(size - sample_bytes) * i // (samples - 1) for i in range(samples)]
+
+
+def requestable_codecs(caps):
+    """Non-zlib codecs worth listing in a GET to a server advertising caps."""
+    return [name for name, codec in CODECS.items() if name not in LEGACY_CODECS and codec.cap in caps]
+
+
+def read_sample(path, size, sample_bytes=4096, samples=3):
+    """A few KB taken from the start, middle and end of the file."""
+    with open(path, 'rb') as f:
+        if size <= sample_bytes * samples: return f.read()
+        parts = []
+        for offset in _sample_offsets(size, sample_bytes, samples):
+            f.seek(offset)
+            parts.append(f.read(sample_bytes))
+    return b"".join(parts)
+
+
+def sample_data(data, sample_bytes=4096, samples=3):
+    """read_sample for bytes already in memory."""
+    if len(data) <= sample_bytes * samples: return data
+    return b"".join(data[o:o + sample_bytes] for o in _sample_offsets(len(data), sample_bytes, samples))
+
+
+def profile(sample, names=None):
+    """{codec name: (compressed/original ratio, CPU seconds per input byte)} measured on sample."""
+    result = {}
+    if not sample: return result
+    for name in names or CODECS:
+        started = time.perf_counter()
+        compressed = CODECS[name].compress(sample)
+        result[name] = (len(compressed) / len(sample), (time.perf_counter() - started) / len(sample))
+    return result
+
+
+def choose(file_profile, link_bps, accepted=None):
+    """
+    The codec with the lowest expected time to compress and send one byte over
+    a link of link_bps bytes/s, or None when sending raw is best. Slow links
+    favour ratio, fast ones favour cheap codecs.
+    """
+    best, best_cost = None, 1.0 / link_bps
+    for name, (ratio, cpu_per_byte) in file_profile.items():
+        if ratio > MIN_RATIO or (accepted is not None and name not in accepted): continue
+        cost = cpu_per_byte + ratio / link_bps
+        if cost < best_cost:
+            best, best_cost = name, cost
+    return best
+
+
+def profile_file(path, size):
+    return profile(read_sample(path, size))
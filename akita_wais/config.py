@@ -13,7 +13,29 @@ DEFAULT_CONFIG = {
   "discovery": {"aspect": "akita.wais.discovery.v1"},
   "server": {
     "data_dir": "wais_data",
-    "announce_interval_sec": 60,
+    "announce_interval_sec": 900,
+    "announce_min_sec": 15,
+    "announce_jitter": 0.1,
+    "catalog_rescan_sec": 30,
+    "catalog_history": 256,
+    "search_page_size": 20,
+    "search_fit_mdu": True,
+    "list_chunk_bytes": 4096,
+    "cache_dir": "wais_cache",
+    "cache_max_mb": 256,
+    "compression_reference_bps": 1000,
+    "cache_warmup": True,
+    "pacing_initial_window": 4,
+    "pacing_max_window": 64,
+    "resource_timeout_sec": 3600,
+    "manifest_block_kb": 256,
+    "delta_max_literal_ratio": 0.5,
+    "transfer_workers": 4,
+    "transfer_per_link": 2,
+    "transfer_queue_size": 32,
+    "peer_cache_path": "known_peers.db",
+    "peer_ttl_sec": 86400,
+    "peer_max": 1024,
     "server_info": {
         "name": "Default Akita Server",
         "description": "Secure WAIS Server",
@@ -22,7 +44,29 @@ DEFAULT_CONFIG = {
   },
   "client": {
     "request_timeout_sec": 30,
-    "server_cache_path": "known_servers.cache"
+    "server_cache_path": "known_servers.db",
+    "peer_ttl_sec": 86400,
+    "peer_max": 1024,
+    "metadata_cache_path": "known_servers.meta.json",
+    "listing_ttl_sec": 300,
+    "search_ttl_sec": 120,
+    "search_cache_entries": 256,
+    "fingerprint_max_age_sec": 1800,
+    "resume_range_kb": 1024,
+    "delta_min_kb": 64,
+    "tail_patterns": ["*.log", "*.csv", "*.jsonl", "*.ndjson"],
+    "link_pool_size": 4,
+    "link_idle_sec": 300,
+    "federated_max_servers": 8,
+    "federated_deadline_sec": 15,
+    "swarm_max_sources": 4,
+    "swarm_range_kb": 256,
+    "busy_max_wait_sec": 30,
+    "download_dir": ".",
+    "store_dir": "wais_store",
+    "web_download_workers": 2,
+    "web_max_jobs": 100,
+    "sync_workers": 2
   }
 }
 
@@ -0,0 +1,256 @@
+import os
+import math
+import struct
+import hashlib
+import zlib
+from .common import MAX_TRANSFER_RAM
+
+# rsync-style block delta.
+#
+# The client describes the copy of a file it already holds as a signature: for
+# every full block, a weak rolling checksum (Adler-32) and a truncated SHA-256.
+# The server slides a block-sized window over its current version, rolling the
+# weak checksum one byte at a time and confirming weak hits with the strong
+# digest, and answers with an instruction stream: COPY runs of the client's
+# blocks and LITERAL bytes for everything that did not match. The client
+# rebuilds the file from its old copy plus the literals and checks the result
+# against the full SHA-256 of the server's version.
+#
+# Tail mode reuses the same instruction stream for append-only files: the
+# client's whole copy is a single block, so the answer is one COPY and the
+# appended bytes.
+
+STRONG_BYTES = 8
+MIN_BLOCK = 1024
+ADLER_MOD = 65521
+
+OP_COPY = b"C"          # C, first block, block count
+OP_LITERAL = b"L"       # L, length, bytes
+_COPY = struct.Struct(">II")
+_LITERAL = struct.Struct(">I")
+_READ_SIZE = 1024 * 1024
+_LITERAL_RUN = 64 * 1024
+
+
+def choose_block_size(size):
+    """
+    Power-of-two block size for a local copy of size bytes. The signature costs
+    (4 + STRONG_BYTES) bytes per block and an edit costs about two blocks of
+    literals, so the total is smallest near sqrt(size * (4 + STRONG_BYTES) / 2).
+    """
+    target = math.sqrt(size * (4 + STRONG_BYTES) / 2)
+    block_size = MIN_BLOCK
+    while block_size * 2 <= target:
+        block_size *= 2
+    return block_size
+
+
+def _strong(block):
+    return hashlib.sha256(block).digest()[:STRONG_BYTES]
+
+
+def signature(path, block_size):
+    """Signature of the local copy at path, as sent in a delta GET."""
+    weak = bytearray()
+    strong = bytearray()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            if len(block) < block_size: break   # trailing partial block travels as a literal
+            weak.extend(struct.pack(">I", zlib.adler32(block)))
+            strong.extend(_strong(block))
+    # Hex strings: compact JSON, and raw bytes in the binary wire encoding
+    return {"block_size": block_size, "weak": weak.hex(), "strong": strong.hex()}
+
+
+def parse_signature(sig):
+    """(block_size, {weak: [block index, ...]}, [strong digest, ...]) from a request; raises ValueError."""
+    block_size = int(sig["block_size"])
+    if block_size < MIN_BLOCK or block_size > MAX_TRANSFER_RAM:
+        raise ValueError("Invalid delta block size")
+    weak = bytes.fromhex(sig["weak"])
+    strong = bytes.fromhex(sig["strong"])
+    count = len(weak) // 4
+    if len(weak) % 4 or len(strong) != count * STRONG_BYTES:
+        raise ValueError("Malformed delta signature")
+    table = {}
+    for index, (value,) in enumerate(struct.iter_unpack(">I", weak)):
+        table.setdefault(value, []).append(index)
+    strongs = [strong[i * STRONG_BYTES:(i + 1) * STRONG_BYTES] for i in range(count)]
+    return block_size, table, strongs
+
+
+class _OpWriter:
+    def __init__(self):
+        self.out = bytearray()
+        self.literal_bytes = 0
+        self._copy = None     # pending run: [first block, count]
+
+    def copy(self, index):
+        if self._copy and self._copy[0] + self._copy[1] == index:
+            self._copy[1] += 1
+            return
+        self._flush_copy()
+        self._copy = [index, 1]
+
+    def literal(self, data):
+        if not data: return
+        self._flush_copy()
+        self.out += OP_LITERAL + _LITERAL.pack(len(data))
+        self.out += data
+        self.literal_bytes += len(data)
+
+    def _flush_copy(self):
+        if self._copy:
+            self.out += OP_COPY + _COPY.pack(*self._copy)
+            self._copy = None
+
+    def finish(self):
+        self._flush_copy()
+        return bytes(self.out)
+
+
+def compute_delta(path, sig, max_literal):
+    """
+    Instruction stream turning the client's copy (described by sig) into the
+    file at path, plus the SHA-256 of that file: (ops, sha256 hex). Returns
+    None once more than max_literal bytes would have to be sent as literals,
+    in which case a plain transfer is cheaper.
+    """
+    block_size, table, strongs = parse_signature(sig)
+    writer = _OpWriter()
+    sha256_hash = hashlib.sha256()
+    buf = bytearray()
+    pos = lit = 0           # window start and start of the pending literal, both indexes into buf
+    weak = a = b = None
+    eof = False
+
+    with open(path, 'rb') as f:
+        while True:
+            # Keep one byte beyond the window so it can roll
+            while not eof and len(buf) < pos + block_size + 1:
+                chunk = f.read(_READ_SIZE)
+                if not chunk:
+                    eof = True
+                    break
+                sha256_hash.update(chunk)
+                buf += chunk
+            if len(buf) - pos < block_size: break
+
+            if weak is None:
+                weak = zlib.adler32(buf[pos:pos + block_size])
+                a, b = weak & 0xFFFF, weak >> 16
+
+            match = None
+            if weak in table:
+                digest = _strong(buf[pos:pos + block_size])
+                for index in table[weak]:
+                    if strongs[index] == digest:
+                        match = index
+                        break
+
+            if match is not None:
+                writer.literal(bytes(buf[lit:pos]))
+                writer.copy(match)
+                pos += block_size
+                lit = pos
+                weak = None
+            else:
+                if pos + block_size < len(buf):
+                    out_byte, in_byte = buf[pos], buf[pos + block_size]
+                    a = (a - out_byte + in_byte) % ADLER_MOD
+                    b = (b - block_size * out_byte + a - 1) % ADLER_MOD
+                    weak = (b << 16) | a
+                else:
+                    weak = None
+                pos += 1
+                if pos - lit >= _LITERAL_RUN:
+                    writer.literal(bytes(buf[lit:pos]))
+                    lit = pos
+
+            if writer.literal_bytes + (pos - lit) > max_literal: return None
+            if lit > _READ_SIZE:
+                # Everything before the pending literal has been emitted
+                del buf[:lit]
+                pos -= lit
+                lit = 0
+
+    writer.literal(bytes(buf[lit:]))
+    if writer.literal_bytes > max_literal: return None
+    return writer.finish(), sha256_hash.hexdigest()
+
+
+def tail_delta(path, size, length, prefix_sha256, max_literal):
+    """
+    Delta for a file that only grew: the client's length bytes become one COPY
+    block (block size length) and the bytes appended since follow as a literal.
+    Returns (ops, sha256 hex of the first size bytes), or None when the prefix
+    no longer matches prefix_sha256 or more than max_literal bytes were added.
+    """
+    if length <= 0 or length > size or size - length > max_literal: return None
+    sha256_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = length
+        while remaining:
+            chunk = f.read(min(remaining, _READ_SIZE))
+            if not chunk: return None
+            sha256_hash.update(chunk)
+            remaining -= len(chunk)
+        if sha256_hash.hexdigest() != prefix_sha256: return None
+        appended = f.read(size - length)
+    if len(appended) != size - length: return None
+    sha256_hash.update(appended)
+    writer = _OpWriter()
+    writer.copy(0)
+    writer.literal(appended)
+    return writer.finish(), sha256_hash.hexdigest()
+
+
+def apply_delta(base_path, ops, block_size, dest_path, expected_sha256):
+    """
+    Rebuilds the new version from base_path and ops, verifies it against
+    expected_sha256 and atomically replaces dest_path. Returns the new size.
+    """
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    tmp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.{os.getpid()}.delta.tmp")
+    sha256_hash = hashlib.sha256()
+    written = 0
+    try:
+        with open(base_path, 'rb') as base, open(tmp_path, 'wb') as out:
+            def emit(data):
+                nonlocal written
+                sha256_hash.update(data)
+                out.write(data)
+                written += len(data)
+
+            pos = 0
+            while pos < len(ops):
+                op = ops[pos:pos + 1]
+                if op == OP_COPY:
+                    first, count = _COPY.unpack_from(ops, pos + 1)
+                    pos += 1 + _COPY.size
+                    base.seek(first * block_size)
+                    remaining = count * block_size
+                    while remaining:
+                        data = base.read(min(remaining, _READ_SIZE))
+                        if not data: raise Exception("Delta refers past the end of the local copy")
+                        emit(data)
+                        remaining -= len(data)
+                elif op == OP_LITERAL:
+                    (length,) = _LITERAL.unpack_from(ops, pos + 1)
+                    start = pos + 1 + _LITERAL.size
+                    if start + length > len(ops): raise Exception("Truncated delta literal")
+                    emit(ops[start:start + length])
+                    pos = start + length
+                else:
+                    raise Exception("Corrupt delta instruction stream")
+
+        if sha256_hash.hexdigest() != expected_sha256:
+            raise Exception(f"Integrity Mismatch! Server: {expected_sha256}, Recv: {sha256_hash.hexdigest()}")
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return written
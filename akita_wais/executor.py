@@ -0,0 +1,114 @@
+import math
+import time
+import threading
+from collections import OrderedDict, deque, defaultdict
+from .common import server_log as log
+
+
+class TransferExecutor:
+    """
+    Bounded worker pool for file transfers and other heavy per-request work.
+
+    At most max_workers jobs run at once, and at most per_key of them for the
+    same key (the requesting link). Jobs wait in one queue per key, served
+    round-robin, so a client that queues many GETs cannot starve the others.
+    submit() refuses new work once max_queued jobs are waiting. A key may
+    hold at most its fair share of the queue (max_queued split between the
+    keys waiting), and keys that already have jobs waiting stop short of the
+    last quarter of the slots, which are kept for keys with nothing queued, so
+    one busy link cannot lock new ones out. retry_after() estimates when a
+    refused client should try again.
+    """
+
+    def __init__(self, max_workers=4, per_key=2, max_queued=32):
+        self.max_workers = max(1, max_workers)
+        self.per_key = max(1, per_key)
+        self.max_queued = max(0, max_queued)
+        self.reserved = self.max_queued // 4   # slots only a key with nothing queued may take
+        self._queues = OrderedDict()        # key -> deque of (fn, args), in round-robin order
+        self._running = defaultdict(int)    # key -> jobs running
+        self._queued = 0
+        self._idle = 0
+        self._threads = []
+        self._avg_duration = 5.0
+        self._shutdown = False
+        self._cond = threading.Condition()
+
+    def submit(self, key, fn, *args):
+        """Queues fn(*args) for key; returns False (and runs nothing) when the queue is full."""
+        with self._cond:
+            if self._shutdown or self._queued >= self.max_queued: return False
+            waiting = len(self._queues.get(key, ()))
+            if waiting:
+                share = max(1, self.max_queued // len(self._queues))
+                if waiting >= share or self._queued >= self.max_queued - self.reserved: return False
+            self._queues.setdefault(key, deque()).append((fn, args))
+            self._queued += 1
+            if self._idle == 0 and len(self._threads) < self.max_workers:
+                worker = threading.Thread(target=self._worker, daemon=True)
+                self._threads.append(worker)
+                worker.start()
+            self._cond.notify_all()
+        return True
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up, from the average job duration."""
+        with self._cond:
+            # Time for the queue ahead of a new job to drain through the workers
+            estimate = self._avg_duration * (self._queued + 1) / self.max_workers
+        return int(min(600, max(1, math.ceil(estimate))))
+
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            self._queues.clear()
+            self._queued = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": len(self._threads),
+                "running": sum(self._running.values()),
+                "queued": self._queued,
+                "clients": len(self._queues),
+                "avg_job_sec": round(self._avg_duration, 1)
+            }
+
+    def _take(self):
+        # Caller holds self._cond. First key in round-robin order that is under its limit.
+        for key, jobs in self._queues.items():
+            if self._running[key] >= self.per_key: continue
+            job = jobs.popleft()
+            if jobs:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            self._queued -= 1
+            self._running[key] += 1
+            return key, job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                taken = self._take()
+                while taken is None and not self._shutdown:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                    taken = self._take()
+                if taken is None: return
+
+            key, (fn, args) = taken
+            started = time.time()
+            try:
+                fn(*args)
+            except Exception as e:
+                log.error(f"Transfer job failed: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.time() - started)
+                    self._running[key] -= 1
+                    if not self._running[key]: del self._running[key]
+                    self._cond.notify_all()
@@ -0,0 +1,108 @@
+import time
+import queue
+import threading
+from .common import client_log as log, STATUS_OK, STATUS_ERROR
+
+
+class SearchMerger:
+    """
+    Merges per-server search pages into one ranking.
+
+    Results are keyed by content digest when the server supplied one, so the
+    same file shared by several servers (under any name) collapses into a
+    single result listing every server that has it. Results without a digest
+    stay per server. Ranking uses reciprocal-rank fusion: each server's page
+    order contributes 1 / (RANK_OFFSET + position), so files that rank high on
+    several servers rise to the top.
+    """
+
+    RANK_OFFSET = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self.answered = []
+        self.failed = []
+
+    def add_response(self, server_info, response):
+        """Records one server's answer: merges its page, or notes the failure."""
+        if response.get("status") == STATUS_OK:
+            self.add(server_info, response)
+            self.answered.append(server_info["hash"])
+        else:
+            self.failed.append({"hash": server_info["hash"], "name": server_info.get("name"), "message": response.get("message")})
+
+    def summary(self):
+        return {
+            "status": STATUS_OK,
+            "results": self.results(),
+            "servers_answered": list(self.answered),
+            "servers_failed": list(self.failed)
+        }
+
+    def add(self, server_info, response):
+        names = response.get("results", [])
+        digests = response.get("digests") or [None] * len(names)
+        server = {"hash": server_info["hash"], "name": server_info.get("name")}
+        with self._lock:
+            for position, (name, digest) in enumerate(zip(names, digests)):
+                key = ("sha256", digest) if digest else ("name", server["hash"], name)
+                result = self._results.setdefault(key, {"name": name, "sha256": digest, "names": [], "servers": [], "score": 0.0})
+                if name not in result["names"]: result["names"].append(name)
+                result["servers"].append(dict(server, name_on_server=name))
+                result["score"] += 1.0 / (self.RANK_OFFSET + position)
+
+    def results(self, limit=None):
+        with self._lock:
+            ranked = sorted(self._results.values(), key=lambda r: (-r["score"], r["name"]))
+            ranked = [dict(r, score=round(r["score"], 4), servers=list(r["servers"]), names=list(r["names"])) for r in ranked]
+        return ranked[:limit] if limit else ranked
+
+
+def iter_federated_search(client, query, servers, deadline, limit=None):
+    """
+    Fans query out to servers concurrently and yields (server_info, response)
+    as each one answers. Stops at the deadline; servers that have not answered
+    by then are reported once with a timeout response and left to finish (and
+    be discarded) in the background.
+    """
+    answers = queue.Queue()
+
+    def ask(server_info):
+        try:
+            response = client.search_files(query, limit=limit, server=server_info, digests=True)
+        except Exception as e:
+            response = {"status": STATUS_ERROR, "message": str(e)}
+        answers.put((server_info, response))
+
+    for server_info in servers:
+        threading.Thread(target=ask, args=(server_info,), daemon=True).start()
+
+    pending = {s["hash"]: s for s in servers}
+    stop_at = time.time() + deadline
+    while pending:
+        remaining = stop_at - time.time()
+        if remaining <= 0: break
+        try:
+            server_info, response = answers.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if pending.pop(server_info["hash"], None) is None: continue
+        yield server_info, response
+
+    for server_info in pending.values():
+        log.info(f"Federated search: {server_info.get('name')} missed the {deadline}s deadline")
+        yield server_info, {"status": STATUS_ERROR, "message": "Deadline exceeded"}
+
+
+def federated_search(client, query, servers, deadline, limit=None, on_update=None):
+    """
+    Runs a federated search to completion (or the deadline) and returns the
+    merged results. on_update(server_info, response, merger) is called as each
+    server answers, for callers that want to show partial results.
+    """
+    merger = SearchMerger()
+    for server_info, response in iter_federated_search(client, query, servers, deadline, limit):
+        merger.add_response(server_info, response)
+        if on_update: on_update(server_info, response, merger)
+    return merger.summary()
@@ -0,0 +1,139 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .common import client_log as log, STATUS_OK, STATUS_ERROR
+from .resume import PartialDownload
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class DownloadJobs:
+    """
+    Background downloads for the web gateway.
+
+    A job runs get_file (or swarm_download) on a small worker pool, so HTTP
+    handlers return at once and any number of users can queue downloads.
+    snapshot() reports progress from the client's in-flight transfers plus,
+    for resumed and swarm downloads, the blocks already verified in the
+    partial file. Finished jobs are forgotten after keep_sec, or sooner,
+    oldest first, when they would keep a new job out; only queued and running
+    jobs count against max_jobs.
+    """
+
+    def __init__(self, client, max_parallel=2, max_jobs=100, keep_sec=3600):
+        self.client = client
+        self.max_jobs = max_jobs
+        self.keep_sec = keep_sec
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="akita-job")
+
+    def submit(self, filename, server=None, swarm=False):
+        """Queues a download; returns the job (an existing one for the same file and server is reused), or None when full."""
+        server_hash = server if isinstance(server, str) or server is None else server.get("hash")
+        with self._lock:
+            self._expire()
+            for job in self._jobs.values():
+                if job["filename"] == filename and job["server"] == server_hash and job["status"] in (JOB_QUEUED, JOB_RUNNING):
+                    return dict(job)
+            if len(self._jobs) >= self.max_jobs: return None
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "filename": filename,
+                "server": server_hash,
+                "swarm": bool(swarm),
+                "status": JOB_QUEUED,
+                "message": None,
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "size": None
+            }
+            self._jobs[job["id"]] = job
+        self._executor.submit(self._run, job["id"])
+        return dict(job)
+
+    def _expire(self):
+        # Caller holds self._lock; also leaves room for one more job when finished ones take it
+        cutoff = time.time() - self.keep_sec
+        excess = len(self._jobs) - self.max_jobs + 1
+        for job in sorted((j for j in self._jobs.values() if j["finished"]), key=lambda j: j["finished"]):
+            if job["finished"] >= cutoff and excess <= 0: break
+            del self._jobs[job["id"]]
+            excess -= 1
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job: job.update(fields)
+            return dict(job) if job else None
+
+    def _run(self, job_id):
+        job = self._update(job_id, status=JOB_RUNNING, started=time.time())
+        if not job: return
+        try:
+            if job["swarm"]:
+                res = self.client.swarm_download(job["filename"], server=job["server"])
+            else:
+                res = self.client.get_file(job["filename"], server=job["server"])
+        except Exception as e:
+            res = {"status": STATUS_ERROR, "message": str(e)}
+
+        if res.get("status") == STATUS_OK:
+            path = self.client.dest_path(job["filename"])
+            size = os.path.getsize(path) if os.path.exists(path) else None
+            self._update(job_id, status=JOB_DONE, size=size, message=res.get("message"), finished=time.time())
+        else:
+            log.warning(f"Download job {job_id} ({job['filename']}) failed: {res.get('message')}")
+            self._update(job_id, status=JOB_FAILED, message=res.get("message"), finished=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._lock:
+            self._expire()
+            return sorted((dict(j) for j in self._jobs.values()), key=lambda j: j["created"])
+
+    def file_path(self, job_id):
+        job = self.get(job_id)
+        if not job or job["status"] != JOB_DONE: return None
+        return self.client.dest_path(job["filename"])
+
+    def snapshot(self, job_id):
+        """The job plus bytes done, total and average throughput so far."""
+        job = self.get(job_id)
+        if not job: return None
+        dest_path = self.client.dest_path(job["filename"])
+        done, total = 0, job["size"]
+
+        if job["status"] == JOB_DONE:
+            done = total or 0
+        elif job["status"] == JOB_RUNNING:
+            partial = PartialDownload.load(dest_path)
+            if partial and partial.state.get("block_size"):
+                done = partial.verified_bytes
+                total = partial.state["size"]
+            for transfer in self.client.transfer_progress():
+                if transfer["dest_path"] != dest_path: continue
+                done += transfer["bytes"]
+                if not transfer["ranged"]: total = transfer["total"]
+
+        elapsed = (job["finished"] or time.time()) - job["started"] if job["started"] else 0
+        job.update({
+            "bytes": done,
+            "total": total,
+            "percent": round(100.0 * done / total, 1) if total else None,
+            "rate_bps": int(done / elapsed) if elapsed > 0 else 0
+        })
+        return job
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
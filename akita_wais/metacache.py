@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from .common import client_log as log
+
+FORMAT_VERSION = 1
+
+
+def search_key(server_hash, request):
+    """Cache key for a search: the server plus every request field that shapes the results."""
+    fields = {k: v for k, v in request.items() if k not in ("action", "etag")}
+    return server_hash + ":" + json.dumps(fields, sort_keys=True, separators=(',', ':'))
+
+
+class MetadataCache:
+    """
+    Per-server file lists and search results, persisted across restarts.
+
+    An entry younger than its TTL is served without touching the network.
+    Older entries are revalidated: a listing by asking LIST for the changes
+    since its catalog version, a search by sending its etag, which the server
+    answers with a bodyless "unchanged" response while the catalog is the
+    same. Search results are kept least-recently-used up to max_searches.
+    """
+
+    def __init__(self, path, listing_ttl=300, search_ttl=120, max_searches=256, save_interval=10):
+        self.path = path
+        self.listing_ttl = listing_ttl
+        self.search_ttl = search_ttl
+        self.max_searches = max_searches
+        self.save_interval = save_interval
+        self._listings = {}              # server hash -> {version, etag, files, checked}
+        self._searches = OrderedDict()   # search key -> {response, checked}, LRU order
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+
+    # --- Persistence ---
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.error(f"Metadata cache unreadable, starting empty: {e}")
+            return
+        if data.get("format") != FORMAT_VERSION: return
+        with self._lock:
+            self._listings = data.get("listings", {})
+            self._searches = OrderedDict((key, entry) for key, entry in data.get("searches", []))
+        log.info(f"Metadata cache loaded {len(self._listings)} listings and {len(self._searches)} searches")
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            snapshot = {
+                "format": FORMAT_VERSION,
+                "listings": dict(self._listings),
+                "searches": list(self._searches.items())
+            }
+            self._dirty = False
+            self._last_save = time.time()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error(f"Could not save metadata cache: {e}")
+
+    def _changed(self):
+        # Caller holds self._lock; the write itself happens outside it
+        self._dirty = True
+        return time.time() - self._last_save >= self.save_interval
+
+    # --- Listings ---
+
+    def listing(self, server_hash):
+        """(entry, fresh) for the held list of server_hash, or (None, False)."""
+        with self._lock:
+            entry = self._listings.get(server_hash)
+            if entry is None: return None, False
+            return dict(entry), time.time() - entry["checked"] < self.listing_ttl
+
+    def put_listing(self, server_hash, version, etag, files):
+        with self._lock:
+            self._listings[server_hash] = {"version": version, "etag": etag, "files": files, "checked": time.time()}
+            flush = self._changed()
+        if flush: self.save()
+
+    def drop_listing(self, server_hash):
+        with self._lock:
+            if self._listings.pop(server_hash, None) is None: return
+            flush = self._changed()
+        if flush: self.save()
+
+    # --- Searches ---
+
+    def search(self, server_hash, request):
+        """(cached response, fresh) for this search, or (None, False)."""
+        key = search_key(server_hash, request)
+        with self._lock:
+            entry = self._searches.get(key)
+            if entry is None: return None, False
+            self._searches.move_to_end(key)
+            return entry["response"], time.time() - entry["checked"] < self.search_ttl
+
+    def put_search(self, server_hash, request, response):
+        key = search_key(server_hash, request)
+        with self._lock:
+            self._searches[key] = {"response": response, "checked": time.time()}
+            self._searches.move_to_end(key)
+            while len(self._searches) > self.max_searches:
+                self._searches.popitem(last=False)
+            flush = self._changed()
+        if flush: self.save()
+
+    def touch_search(self, server_hash, request):
+        """Marks a cached search as just revalidated."""
+        with self._lock:
+            entry = self._searches.get(search_key(server_hash, request))
+            if entry is None: return
+            entry["checked"] = time.time()
+            self._dirty = True
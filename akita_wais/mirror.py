@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .common import client_log as log, STATUS_OK, STATUS_ERROR, CAP_STAT
+
+STATE_FILE = ".akita_sync.json"
+
+SYNC_NEW = "new"
+SYNC_UPDATED = "updated"
+SYNC_UNCHANGED = "unchanged"
+SYNC_FAILED = "failed"
+
+
+class DirectoryMirror:
+    """
+    Mirrors one server's catalog into the client's download directory.
+
+    Each listed file is stat'ed on the server and compared with the local copy
+    by size and SHA-256; only new or changed files are fetched, through
+    get_file, so changed files go out as deltas or tails and interrupted ones
+    resume from their partial blocks. Local digests are remembered in a state
+    file keyed by size and mtime, so an unchanged tree is not re-hashed on every
+    run. Downloads are atomic renames and the state file is rewritten after
+    each file, so an interrupted sync simply picks up on the next run.
+    """
+
+    def __init__(self, client, server_info, workers=2):
+        self.client = client
+        self.server_info = server_info
+        self.workers = max(1, workers)
+        self.state_path = os.path.join(client.download_dir, STATE_FILE)
+        self._state = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                self._state = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning(f"Sync state {self.state_path} unreadable, re-hashing local files: {e}")
+
+    def _save(self):
+        # Caller holds self._lock
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._state, f, separators=(',', ':'))
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            log.error(f"Could not save sync state: {e}")
+
+    # --- Local copies ---
+
+    def _local_digest(self, name):
+        """(size, SHA-256) of the local copy of name, or None; hashes only when size or mtime moved."""
+        path = self.client.dest_path(name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            known = self._state.get(name)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["size"], known["sha256"]
+
+        sha256_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                sha256_hash.update(chunk)
+        self._remember(name, st, sha256_hash.hexdigest())
+        return st.st_size, sha256_hash.hexdigest()
+
+    def _remember(self, name, st, sha256):
+        with self._lock:
+            self._state[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+            self._save()
+
+    # --- Sync ---
+
+    def sync_file(self, name):
+        """Brings one file up to date; returns (outcome, message)."""
+        local = self._local_digest(name)
+        stat = None
+        if self.client._server_supports(CAP_STAT, self.server_info):
+            stat = self.client.stat_file(name, self.server_info)
+            if stat.get("status") != STATUS_OK: return SYNC_FAILED, stat.get("message")
+            if local and local == (stat["size"], stat["sha256"]):
+                return SYNC_UNCHANGED, None
+
+        res = self.client.get_file(name, server=self.server_info, stat=stat)
+        if res.get("status") != STATUS_OK: return SYNC_FAILED, res.get("message")
+
+        path = self.client.dest_path(name)
+        if stat:
+            # get_file verified the download against the server's SHA-256 already
+            self._remember(name, os.stat(path), stat["sha256"])
+        else:
+            self._local_digest(name)
+        return (SYNC_UPDATED if local else SYNC_NEW), res.get("message")
+
+    def run(self, on_file=None):
+        """
+        Syncs every file in the server's catalog, workers at a time. on_file(name,
+        outcome, message) is called as each one finishes. Returns a summary dict.
+        """
+        started = time.time()
+        listing = self.client.get_server_list(self.server_info)
+        if listing.get("status") != STATUS_OK: return listing
+        names = listing.get("files", [])
+
+        counts = {SYNC_NEW: 0, SYNC_UPDATED: 0, SYNC_UNCHANGED: 0, SYNC_FAILED: 0}
+        failed = []
+
+        def sync_one(name):
+            try:
+                outcome, message = self.sync_file(name)
+            except Exception as e:
+                outcome, message = SYNC_FAILED, str(e)
+            with self._lock:
+                counts[outcome] += 1
+                if outcome == SYNC_FAILED: failed.append({"filename": name, "message": message})
+            if outcome == SYNC_FAILED:
+                log.warning(f"Sync of {name} failed: {message}")
+            if on_file: on_file(name, outcome, message)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="akita-sync") as executor:
+            list(executor.map(sync_one, names))
+
+        with self._lock:
+            # Forget files that left the catalog; their local copies are kept
+            listed = set(names)
+            for name in [n for n in self._state if n not in listed]:
+                del self._state[name]
+            self._save()
+
+        return {
+            "status": STATUS_ERROR if failed else STATUS_OK,
+            "message": f"{len(failed)} of {len(names)} files failed" if failed else f"{len(names)} files in sync",
+            "files": len(names),
+            "counts": counts,
+            "failed": failed,
+            "elapsed": round(time.time() - started, 1)
+        }
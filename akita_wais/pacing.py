@@ -0,0 +1,107 @@
+import time
+import threading
+import RNS as R
+
+DEFAULT_RTT = 0.5
+
+
+class LinkPacer:
+    """
+    AIMD send window for one link.
+
+    Packets are admitted while fewer than `window` are awaiting a delivery receipt,
+    spaced by srtt / window so bursts do not overrun slow interface queues. Each
+    delivery grows the window (slow start, then additive increase); a receipt
+    timeout halves it at most once per RTT. When link.send() returns no receipt
+    the pacer falls back to pure rate pacing from the link RTT.
+    """
+
+    def __init__(self, link, initial_window=4, min_window=1, max_window=64):
+        self.link_id = R.prettyhexrep(link.hash) if getattr(link, 'hash', None) else repr(link)
+        self.min_window = min_window
+        self.max_window = max_window
+        self.window = float(initial_window)
+        self.ssthresh = float(max_window)
+        self.srtt = getattr(link, 'rtt', None) or DEFAULT_RTT
+        self.in_flight = 0
+        self.sent = 0
+        self.delivered = 0
+        self.lost = 0
+        self.started = time.time()
+        self._last_send = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def rate(self):
+        """Current target rate in packets per second."""
+        return self.window / max(self.srtt, 0.001)
+
+    def acquire(self):
+        """Blocks until the window admits another packet and the pacing gap has passed."""
+        with self._cond:
+            stall_timeout = max(4 * self.srtt, 1.0)
+            while self.in_flight >= int(self.window):
+                if not self._cond.wait(timeout=stall_timeout):
+                    # Receipts went missing without a timeout callback; treat the window as lost
+                    self.lost += self.in_flight
+                    self.in_flight = 0
+                    self._decrease()
+            gap = self.srtt / max(self.window, 1.0)
+            delay = self._last_send + gap - time.time()
+            self._last_send = max(time.time(), self._last_send + gap)
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_sent(self, receipt):
+        with self._cond:
+            self.sent += 1
+            if receipt is None or not hasattr(receipt, 'set_delivery_callback'):
+                return
+            self.in_flight += 1
+        receipt.set_delivery_callback(self._on_delivered)
+        if hasattr(receipt, 'set_timeout_callback'):
+            receipt.set_timeout_callback(self._on_timeout)
+
+    def _on_delivered(self, receipt):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.delivered += 1
+            sample = receipt.get_rtt() if hasattr(receipt, 'get_rtt') else None
+            if sample:
+                self.srtt = 0.875 * self.srtt + 0.125 * sample
+            if self.window < self.ssthresh:
+                self.window += 1.0
+            else:
+                self.window += 1.0 / self.window
+            self.window = min(self.window, self.max_window)
+            self._cond.notify_all()
+
+    def _on_timeout(self, receipt):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.lost += 1
+            self._decrease()
+            self._cond.notify_all()
+
+    def _decrease(self):
+        # Caller holds the condition; one multiplicative decrease per RTT
+        now = time.time()
+        if now - self._last_decrease < self.srtt: return
+        self._last_decrease = now
+        self.ssthresh = max(self.min_window, self.window / 2)
+        self.window = self.ssthresh
+
+    def stats(self):
+        with self._cond:
+            return {
+                "link": self.link_id,
+                "rate_pps": round(self.rate, 1),
+                "window": round(self.window, 2),
+                "srtt_ms": round(self.srtt * 1000, 1),
+                "in_flight": self.in_flight,
+                "sent": self.sent,
+                "delivered": self.delivered,
+                "lost": self.lost,
+                "age_sec": round(time.time() - self.started, 1)
+            }
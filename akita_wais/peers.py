@@ -0,0 +1,150 @@
+import json
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from .common import common_log as log
+
+# A peer seen again within this many seconds, with unchanged info, is not rewritten to disk
+PERSIST_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS peers (
+    hash TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL,
+    info TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS peers_last_seen ON peers (last_seen);
+"""
+
+
+class PeerRegistry:
+    """
+    Bounded, persistent registry of servers discovered through announces.
+
+    Entries live in memory in last-seen order (an announce moves its peer to
+    the end), so newest-first listings, TTL expiry and least-recently-seen
+    eviction never sort. Every change is written through to a small SQLite
+    database indexed on last_seen; startup loads only the newest max_peers
+    entries that have not expired, so neither a crash nor a large mesh costs
+    more than the last few seconds of announces.
+    """
+
+    def __init__(self, path, ttl=86400, max_peers=1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_peers = max_peers
+        self._peers = OrderedDict()     # hash -> info, oldest last_seen first
+        self._persisted = {}            # hash -> (last_seen, info) as last written
+        self._lock = threading.Lock()
+        self._db = None
+
+    # --- Persistence ---
+
+    def load(self):
+        """Opens the database and loads the live entries; an unreadable file is set aside and replaced."""
+        with self._lock:
+            try:
+                self._open()
+            except sqlite3.DatabaseError as e:
+                log.warning(f"Peer registry {self.path} unreadable ({e}); starting a new one.")
+                try:
+                    os.replace(self.path, self.path + ".old")
+                    self._open()
+                except (OSError, sqlite3.DatabaseError) as e:
+                    log.error(f"Could not open peer registry {self.path}: {e}; peers will not persist.")
+                    self._db = None
+                    return
+            cutoff = time.time() - self.ttl
+            self._db.execute("DELETE FROM peers WHERE last_seen < ?", (cutoff,))
+            rows = self._db.execute(
+                "SELECT hash, last_seen, info FROM peers ORDER BY last_seen DESC LIMIT ?", (self.max_peers,)
+            ).fetchall()
+            for key, last_seen, info in reversed(rows):
+                try:
+                    self._peers[key] = dict(json.loads(info), last_seen=last_seen)
+                except ValueError:
+                    continue
+                self._persisted[key] = (last_seen, info)
+            self._db.commit()
+        log.info(f"Peer registry loaded {len(self._peers)} peers from {self.path}")
+
+    def _open(self):
+        # Caller holds self._lock
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def _write(self, key, info):
+        # Caller holds self._lock
+        if self._db is None: return
+        payload = json.dumps({k: v for k, v in info.items() if k != "last_seen"}, separators=(',', ':'))
+        previous = self._persisted.get(key)
+        if previous and previous[1] == payload and info["last_seen"] - previous[0] < PERSIST_INTERVAL: return
+        try:
+            self._db.execute("INSERT OR REPLACE INTO peers (hash, last_seen, info) VALUES (?, ?, ?)", (key, info["last_seen"], payload))
+            self._db.commit()
+            self._persisted[key] = (info["last_seen"], payload)
+        except sqlite3.Error as e:
+            log.error(f"Could not persist peer {key}: {e}")
+
+    def _delete(self, keys):
+        # Caller holds self._lock
+        for key in keys: self._persisted.pop(key, None)
+        if self._db is None or not keys: return
+        try:
+            self._db.executemany("DELETE FROM peers WHERE hash = ?", [(k,) for k in keys])
+            self._db.commit()
+        except sqlite3.Error as e:
+            log.error(f"Could not delete expired peers: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._db is None: return
+            self._db.close()
+            self._db = None
+
+    # --- Registry ---
+
+    def _expire(self):
+        # Caller holds self._lock; the oldest entries are at the front
+        cutoff = time.time() - self.ttl
+        gone = []
+        while self._peers:
+            key, info = next(iter(self._peers.items()))
+            if info["last_seen"] >= cutoff and len(self._peers) <= self.max_peers: break
+            del self._peers[key]
+            gone.append(key)
+        self._delete(gone)
+
+    def update(self, key, info):
+        """Records an announce from key; info is stored with last_seen set to now."""
+        info = dict(info, last_seen=time.time())
+        with self._lock:
+            self._peers.pop(key, None)
+            self._peers[key] = info
+            self._write(key, info)
+            self._expire()
+
+    def get(self, key):
+        with self._lock:
+            info = self._peers.get(key)
+            if info is None or info["last_seen"] < time.time() - self.ttl: return None
+            return dict(info)
+
+    def recent(self, limit=None):
+        """Live peers, most recently seen first."""
+        with self._lock:
+            self._expire()
+            result = []
+            for info in reversed(self._peers.values()):
+                if limit is not None and len(result) >= limit: break
+                result.append(dict(info))
+            return result
+
+    def __len__(self):
+        with self._lock:
+            self._expire()
+            return len(self._peers)
@@ -0,0 +1,183 @@
+import time
+import threading
+from contextlib import contextmanager
+import RNS as R
+from .common import client_log as log, ASPECT_SERVICE, split_destination_name
+
+
+class LinkPool:
+    """
+    Established links to WAIS servers, keyed by server hash.
+
+    Links are opened lazily by the first request for a server and reused by
+    every later one, so talking to another server no longer tears down the
+    current link. Different servers connect in parallel; a request for a server
+    that is already connecting waits for that attempt instead of opening a
+    second link. At most max_links are open at once: the least recently used
+    idle link is closed to make room, and links idle for idle_timeout seconds
+    are closed by a background reaper.
+    """
+
+    def __init__(self, configure_link, closed_callback, max_links=4, idle_timeout=300, connect_timeout=20):
+        self._configure_link = configure_link    # installs the client's handlers on a new link
+        self._closed_callback = closed_callback
+        self.max_links = max(1, max_links)
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._entries = {}                       # server hash -> link, lease count, readiness
+        self._cond = threading.Condition()
+        self._reaper = None
+        self._running = False
+
+    # --- Lifecycle ---
+
+    def start(self):
+        self._running = True
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def close_all(self):
+        self._running = False
+        with self._cond:
+            links = [e["link"] for e in self._entries.values() if e["link"] is not None]
+            self._entries.clear()
+            self._cond.notify_all()
+        for link in links:
+            if link.status != R.Link.CLOSED: link.teardown()
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.idle_timeout / 4, 30.0))
+        while self._running:
+            time.sleep(interval)
+            cutoff = time.time() - self.idle_timeout
+            with self._cond:
+                idle = [k for k, e in self._entries.items()
+                        if e["leases"] == 0 and e["ready"].is_set() and e["last_used"] < cutoff]
+                links = [self._entries.pop(k)["link"] for k in idle]
+            for key, link in zip(idle, links):
+                if link is not None and link.status != R.Link.CLOSED:
+                    log.debug(f"Closing idle link to {key}")
+                    link.teardown()
+
+    # --- Leasing ---
+
+    def is_connected(self, server_hash):
+        with self._cond:
+            entry = self._entries.get(server_hash)
+            return bool(entry and entry["link"] is not None and entry["link"].status == R.Link.ACTIVE)
+
+    @contextmanager
+    def lease(self, server_info):
+        """Yields an active link to server_info (None if it cannot be reached); idle eviction skips it meanwhile."""
+        link = self.acquire(server_info)
+        try:
+            yield link
+        finally:
+            if link is not None: self.release(server_info["hash"])
+
+    def try_acquire(self, server_info):
+        """Leases the link to server_info if it is already established; never blocks on connecting."""
+        with self._cond:
+            entry = self._entries.get(server_info["hash"])
+            if not entry or not entry["ready"].is_set(): return None
+            link = entry["link"]
+            if link is None or link.status != R.Link.ACTIVE: return None
+            entry["leases"] += 1
+            entry["last_used"] = time.time()
+            return link
+
+    def acquire(self, server_info):
+        key = server_info["hash"]
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry and entry["ready"].is_set() and (entry["link"] is None or entry["link"].status == R.Link.CLOSED):
+                self._entries.pop(key, None)
+                entry = None
+            connect = entry is None
+            if connect:
+                entry = {"server": server_info, "link": None, "ready": threading.Event(), "up": threading.Event(),
+                         "leases": 0, "last_used": time.time()}
+                self._entries[key] = entry
+            entry["leases"] += 1
+            entry["last_used"] = time.time()
+
+        if connect:
+            self._connect(key, entry)
+        else:
+            entry["ready"].wait(self.connect_timeout)
+
+        link = entry["link"]
+        if link is None or link.status != R.Link.ACTIVE:
+            self.release(key, entry)
+            return None
+        return link
+
+    def release(self, key, entry=None):
+        with self._cond:
+            entry = entry or self._entries.get(key)
+            if entry is None: return
+            entry["leases"] = max(0, entry["leases"] - 1)
+            entry["last_used"] = time.time()
+            self._cond.notify_all()
+
+    # --- Connecting ---
+
+    def _make_room(self, key):
+        """Closes the least recently used idle link while the pool is full; False if none frees up in time."""
+        deadline = time.time() + self.connect_timeout
+        with self._cond:
+            while True:
+                others = {k: e for k, e in self._entries.items() if k != key}
+                if len(others) < self.max_links: return True
+                idle = [(e["last_used"], k) for k, e in others.items() if e["leases"] == 0 and e["ready"].is_set()]
+                if idle:
+                    victim = self._entries.pop(min(idle)[1])
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0: return False
+                self._cond.wait(remaining)
+        if victim["link"] is not None and victim["link"].status != R.Link.CLOSED:
+            victim["link"].teardown()
+        return True
+
+    def _connect(self, key, entry):
+        server_info = entry["server"]
+        try:
+            if not self._make_room(key):
+                log.warning(f"Link pool full ({self.max_links} busy links); cannot connect to {server_info['name']}")
+                return
+
+            server_identity = R.Identity.recall(bytes.fromhex(key))
+            if not server_identity: return
+
+            service_app_name, service_aspects = split_destination_name(ASPECT_SERVICE)
+            server_destination = R.Destination(
+                server_identity, R.Destination.OUT, R.Destination.SINGLE,
+                service_app_name, *service_aspects
+            )
+
+            log.info(f"Connecting to {server_info['name']}...")
+            link = R.Link(server_destination)
+            entry["link"] = link
+            link.set_link_established_callback(lambda l: entry["up"].set())
+            link.set_link_closed_callback(self._link_closed)
+            self._configure_link(link, server_info)
+
+            if link.status == R.Link.PENDING and not entry["up"].wait(self.connect_timeout):
+                link.teardown()
+        except Exception as e:
+            log.error(f"Connecting to {server_info['name']} failed: {e}")
+        finally:
+            if entry["link"] is None or entry["link"].status != R.Link.ACTIVE:
+                with self._cond:
+                    if self._entries.get(key) is entry: del self._entries[key]
+            entry["ready"].set()
+
+    def _link_closed(self, link):
+        with self._cond:
+            for key, entry in list(self._entries.items()):
+                if entry["link"] is link:
+                    del self._entries[key]
+                    entry["up"].set()
+            self._cond.notify_all()
+        self._closed_callback(link)
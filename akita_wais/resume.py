@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+from .common import client_log as log, block_digest
+
+PARTIAL_SUFFIX = ".part"
+STATE_SUFFIX = ".part.json"
+
+
+class PartialDownload:
+    """
+    A partially downloaded file plus its sidecar state.
+
+    The partial file holds whatever bytes have arrived so far at their final
+    offsets. Once the server's chunk manifest is known, blocks are verified
+    against it individually, so a resumed download only fetches the blocks that
+    are missing or failed verification. The sidecar is rewritten after every
+    change, so an interrupted client picks up where it left off.
+    """
+
+    def __init__(self, dest_path, state=None):
+        self.dest_path = dest_path
+        self.part_path = dest_path + PARTIAL_SUFFIX
+        self.state_path = dest_path + STATE_SUFFIX
+        self.state = state or {
+            "filename": os.path.basename(dest_path),
+            "sha256": None,
+            "size": None,
+            "block_size": None,
+            "blocks": [],
+            "verified": []
+        }
+
+    @classmethod
+    def load(cls, dest_path):
+        """Returns the PartialDownload for dest_path, or None if there is nothing to resume."""
+        state_path = dest_path + STATE_SUFFIX
+        if not os.path.exists(state_path): return None
+        try:
+            with open(state_path, 'r') as f:
+                return cls(dest_path, json.load(f))
+        except Exception as e:
+            log.warning(f"Ignoring unreadable resume state {state_path}: {e}")
+            return None
+
+    @classmethod
+    def from_interrupted(cls, dest_path, tmp_path, meta):
+        """Adopts the temp file of an interrupted transfer as a resumable partial download."""
+        partial = cls(dest_path)
+        os.replace(tmp_path, partial.part_path)
+        partial.state["sha256"] = meta.get("sha256")
+        partial.state["size"] = meta.get("original_size")
+        partial.save()
+        return partial
+
+    def save(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def discard(self):
+        for path in (self.part_path, self.state_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # --- Block bookkeeping ---
+
+    def adopt_manifest(self, manifest):
+        """Applies the server's manifest; resets the partial if the file changed on the server."""
+        if self.state["sha256"] and self.state["sha256"] != manifest["sha256"]:
+            log.info(f"{self.state['filename']} changed on the server; discarding partial download.")
+            self.discard()
+            self.state["verified"] = []
+        if self.state["block_size"] != manifest["block_size"]:
+            self.state["verified"] = []
+        self.state.update({
+            "sha256": manifest["sha256"],
+            "size": manifest["size"],
+            "block_size": manifest["block_size"],
+            "blocks": manifest["blocks"]
+        })
+        self.verify_local()
+
+    def _block_length(self, index):
+        block_size = self.state["block_size"]
+        return min(block_size, self.state["size"] - index * block_size)
+
+    def verify_local(self):
+        """Marks blocks already present in the partial file that match the manifest."""
+        verified = set(self.state["verified"])
+        if os.path.exists(self.part_path):
+            part_size = os.path.getsize(self.part_path)
+            block_size = self.state["block_size"]
+            with open(self.part_path, 'rb') as f:
+                for index, digest in enumerate(self.state["blocks"]):
+                    if index in verified: continue
+                    length = self._block_length(index)
+                    if index * block_size + length > part_size: break
+                    f.seek(index * block_size)
+                    if block_digest(f.read(length)) == digest:
+                        verified.add(index)
+        self.state["verified"] = sorted(verified)
+        self.save()
+
+    def missing_ranges(self, max_bytes):
+        """Contiguous (offset, length) runs of unverified blocks, each at most max_bytes long."""
+        verified = set(self.state["verified"])
+        block_size = self.state["block_size"]
+        per_range = max(1, max_bytes // block_size)
+        ranges = []
+        run_start = None
+        for index in range(len(self.state["blocks"]) + 1):
+            missing = index < len(self.state["blocks"]) and index not in verified
+            if missing and run_start is None:
+                run_start = index
+            if run_start is not None and (not missing or index - run_start == per_range):
+                end = index
+                length = sum(self._block_length(i) for i in range(run_start, end))
+                ranges.append((run_start * block_size, length))
+                run_start = index if missing else None
+        return ranges
+
+    def write_range(self, offset, data):
+        """Writes the blocks of data that match the manifest; returns the number that did not."""
+        block_size = self.state["block_size"]
+        if offset % block_size: raise ValueError("Range is not block aligned")
+        verified = set(self.state["verified"])
+        bad = 0
+        mode = 'r+b' if os.path.exists(self.part_path) else 'wb'
+        with open(self.part_path, mode) as f:
+            for pos in range(0, len(data), block_size):
+                index = (offset + pos) // block_size
+                if index >= len(self.state["blocks"]): break
+                block = data[pos:pos + self._block_length(index)]
+                if block_digest(block) != self.state["blocks"][index]:
+                    bad += 1
+                    continue
+                f.seek(offset + pos)
+                f.write(block)
+                verified.add(index)
+        self.state["verified"] = sorted(verified)
+        self.save()
+        return bad
+
+    @property
+    def verified_bytes(self):
+        return sum(self._block_length(i) for i in self.state["verified"])
+
+    @property
+    def complete(self):
+        return len(self.state["verified"]) == len(self.state["blocks"])
+
+    def finish(self):
+        """Verifies the assembled file against the full SHA-256 and moves it into place."""
+        with open(self.part_path, 'a+b') as f:
+            f.truncate(self.state["size"])
+        sha256_hash = hashlib.sha256()
+        with open(self.part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                sha256_hash.update(chunk)
+        if sha256_hash.hexdigest() != self.state["sha256"]:
+            self.state["verified"] = []
+            self.save()
+            raise Exception(f"Integrity Mismatch! Server: {self.state['sha256']}, Recv: {sha256_hash.hexdigest()}")
+        os.replace(self.part_path, self.dest_path)
+        os.remove(self.state_path)
+        return self.state["size"]
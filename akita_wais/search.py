@@ -0,0 +1,157 @@
+import re
+import heapq
+import threading
+from collections import defaultdict
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Per-term relevance weights
+SCORE_EXACT = 10
+SCORE_PREFIX = 6
+SCORE_SUBSTRING = 3
+SCORE_KEYWORD = 1
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    Token + trigram inverted index over shared filenames.
+
+    Query terms are ANDed. A term matches a file when it is a substring of the
+    lowercased filename; trigram postings narrow the candidates so queries do not
+    scan the whole catalog. A term that matches no filename but does match one of
+    the server keywords is satisfied by every file, since the keywords describe
+    the server as a whole.
+    """
+
+    def __init__(self, keywords=()):
+        self._lock = threading.Lock()
+        self._docs = {}                      # name -> (lowercased name, token set)
+        self._tokens = defaultdict(set)      # token -> names
+        self._trigrams = defaultdict(set)    # trigram -> names
+        self._keywords = set()
+        for keyword in keywords:
+            self._keywords.update(tokenize(keyword))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+    # --- Maintenance ---
+
+    def on_catalog_change(self, added, removed, changed):
+        """FileCatalog listener; only names matter to the index."""
+        with self._lock:
+            for name in removed:
+                self._remove(name)
+            for entry in added:
+                self._add(entry.name)
+
+    def add(self, name):
+        with self._lock:
+            self._add(name)
+
+    def remove(self, name):
+        with self._lock:
+            self._remove(name)
+
+    def _add(self, name):
+        if name in self._docs: return
+        lower = name.lower()
+        tokens = set(tokenize(lower))
+        self._docs[name] = (lower, tokens)
+        for token in tokens:
+            self._tokens[token].add(name)
+        for gram in trigrams(lower):
+            self._trigrams[gram].add(name)
+
+    def _remove(self, name):
+        doc = self._docs.pop(name, None)
+        if not doc: return
+        lower, tokens = doc
+        for token in tokens:
+            self._discard(self._tokens, token, name)
+        for gram in trigrams(lower):
+            self._discard(self._trigrams, gram, name)
+
+    @staticmethod
+    def _discard(postings, key, name):
+        names = postings.get(key)
+        if names is None: return
+        names.discard(name)
+        if not names: del postings[key]
+
+    # --- Querying ---
+
+    def _candidates(self, term):
+        """Names whose lowercased filename contains term."""
+        if len(term) >= 3:
+            grams = sorted((self._trigrams.get(g, ()) for g in trigrams(term)), key=len)
+            if not grams or not grams[0]: return set()
+            result = set(grams[0])
+            for names in grams[1:]:
+                result &= names
+                if not result: break
+            return {n for n in result if term in self._docs[n][0]}
+
+        # Short terms: terms are alphanumeric, so any match lies inside one token
+        result = set()
+        for token, names in self._tokens.items():
+            if term in token:
+                result |= names
+        return result
+
+    def _term_score(self, term, name):
+        tokens = self._docs[name][1]
+        if term in tokens: return SCORE_EXACT
+        if any(t.startswith(term) for t in tokens): return SCORE_PREFIX
+        return SCORE_SUBSTRING
+
+    def _is_keyword(self, term):
+        return any(term in keyword for keyword in self._keywords)
+
+    def search(self, query, offset=0, limit=20):
+        """Returns (total_matches, [(name, score), ...]) for the requested page."""
+        offset = max(0, int(offset or 0))
+        limit = max(1, int(limit or 1))
+        terms = list(dict.fromkeys(tokenize(query or "")))
+
+        with self._lock:
+            if not terms:
+                raw = (query or "").strip().lower()
+                # Punctuation-only queries fall back to a plain substring match
+                names = [n for n, (lower, _) in self._docs.items() if raw in lower]
+                ranked = sorted((n, 0) for n in names)
+                return len(ranked), ranked[offset:offset + limit]
+
+            matched = None
+            scores = defaultdict(int)
+            keyword_bonus = 0
+            # Longest (most selective) terms first so the intersection shrinks quickly
+            for term in sorted(terms, key=len, reverse=True):
+                names = self._candidates(term)
+                if not names and self._is_keyword(term):
+                    keyword_bonus += SCORE_KEYWORD
+                    continue
+                matched = names if matched is None else matched & names
+                if not matched: return 0, []
+                for name in matched:
+                    scores[name] += self._term_score(term, name)
+
+            if matched is None:
+                matched = self._docs.keys()
+            # Only the requested page is fully ordered
+            ranked = heapq.nsmallest(
+                offset + limit,
+                ((n, scores[n] + keyword_bonus) for n in matched),
+                key=lambda item: (-item[1], len(item[0]), item[0])
+            )
+            total = len(matched)
+        return total, ranked[offset:offset + limit]
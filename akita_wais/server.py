@@ -1,16 +1,27 @@
 import RNS as R
+import io
 import os
 import json
 import time
 import threading
-import zlib
-import hashlib
 from .common import (
     server_log as log, ASPECT_DISCOVERY, ASPECT_SERVICE, PROTOCOL_VERSION,
-    ACTION_LIST, ACTION_GET, ACTION_SEARCH, ACTION_PEER_LIST,
-    STATUS_OK, STATUS_ERROR, STATUS_FILE_META, MAX_ANNOUNCE_SIZE,
-    MAX_TRANSFER_RAM, calculate_sha256, split_destination_name
+    ACTION_LIST, ACTION_GET, ACTION_SEARCH, ACTION_PEER_LIST, ACTION_MANIFEST, ACTION_STAT,
+    STATUS_OK, STATUS_ERROR, STATUS_FILE_META, STATUS_BUSY, MAX_ANNOUNCE_SIZE, MAX_TRANSFER_RAM,
+    SERVER_CAPS, BASELINE_CAPS, ANNOUNCE_FINGERPRINT_HEX, MODE_PACKETS, MODE_RESOURCE, STREAM_HEADER, SEARCH_DIGEST_HEX,
+    calculate_sha256, split_destination_name
 )
+from .catalog import FileCatalog
+from .search import SearchIndex
+from .cache import TransferCache
+from .streaming import CompressingReader
+from .compression import get_codec, accepted_codecs, choose, profile, sample_data, DEFAULT_CODEC
+from .pacing import LinkPacer
+from .executor import TransferExecutor
+from .delta import compute_delta, tail_delta
+from .peers import PeerRegistry
+from .announce import AnnounceScheduler
+from . import wire
 
 class AkitaWAISServer:
     def __init__(self, config, reticulum_instance):
@@ -23,8 +34,14 @@ class AkitaWAISServer:
         self.service_destination = None
         self.announce_handler = None
         self.running = False
-        self._announce_timer = None
-        self._server_peers = {} 
+        self._announcer = None
+        self._server_peers = PeerRegistry(
+            self.server_config.get('peer_cache_path', 'known_peers.db'),
+            ttl=self.server_config.get('peer_ttl_sec', 86400),
+            max_peers=self.server_config.get('peer_max', 1024)
+        )
+        self._pacers = {}
+        self._binary_links = set()      # links whose client speaks the binary wire encoding
         self._lock = threading.Lock() 
 
         if not os.path.exists(self.server_config['data_dir']):
@@ -33,6 +50,28 @@ class AkitaWAISServer:
             except OSError:
                 log.error(f"Could not create data dir: {self.server_config['data_dir']}")
 
+        self.catalog = FileCatalog(
+            self.server_config['data_dir'],
+            rescan_interval=self.server_config.get('catalog_rescan_sec', 30),
+            history=self.server_config.get('catalog_history', 256)
+        )
+        self.search_index = SearchIndex(self.server_config['server_info'].get('keywords', []))
+        self.catalog.add_listener(self.search_index.on_catalog_change)
+
+        self.transfer_cache = TransferCache(
+            self.server_config.get('cache_dir', 'wais_cache'),
+            max_bytes=self.server_config.get('cache_max_mb', 256) * 1024 * 1024,
+            link_bps=self.server_config.get('compression_reference_bps', 1000)
+        )
+        self.catalog.add_listener(self.transfer_cache.on_catalog_change)
+
+        # GETs and manifest builds run on a bounded pool instead of a thread per request
+        self.transfer_executor = TransferExecutor(
+            max_workers=self.server_config.get('transfer_workers', 4),
+            per_key=self.server_config.get('transfer_per_link', 2),
+            max_queued=self.server_config.get('transfer_queue_size', 32)
+        )
+
     def start(self, identity):
         self.identity = identity
         if not self.identity:
@@ -49,6 +88,9 @@ class AkitaWAISServer:
             *service_aspects,
         )
 
+        self._server_peers.load()
+        self.catalog.start()
+        self.transfer_cache.start(self.catalog.entries(), warm_up=self.server_config.get('cache_warmup', True))
         self.service_destination.set_link_established_callback(self._link_established)
         self._start_discovery_listener()
         self._start_announcing()
@@ -60,37 +102,52 @@ class AkitaWAISServer:
 
     def stop(self):
         self.running = False
-        if self._announce_timer: self._announce_timer.cancel()
+        if self._announcer: self._announcer.stop()
         if self.announce_handler: R.Transport.deregister_announce_handler(self.announce_handler)
+        self.catalog.stop()
+        self.transfer_executor.shutdown()
+        self.transfer_cache.stop()
+        self._server_peers.close()
+        for stats in self.pacing_stats():
+            log.info(f"Link open at stop: {stats}")
         log.info("Akita WAIS Server stopping.")
 
-    def _start_announcing(self):
-        interval = self.server_config.get('announce_interval_sec', 60)
-        if interval <= 0: return
-
+    def _announce_data(self):
+        """Announce app_data: name, description, protocol version, extra caps and the catalog fingerprint."""
         app_data_dict = {
             "name": self.server_config['server_info'].get("name", "Akita Server")[:30],
             "desc": self.server_config['server_info'].get("description", "")[:60],
             "v": PROTOCOL_VERSION,
-            "caps": ["zlib", "sha256"]
+            "fp": self.catalog.etag[:ANNOUNCE_FINGERPRINT_HEX]
         }
-        app_data_bytes = json.dumps(app_data_dict).encode('utf-8')
+        extra_caps = [c for c in SERVER_CAPS if c not in BASELINE_CAPS]
+        if extra_caps: app_data_dict["caps"] = extra_caps
+        app_data_bytes = json.dumps(app_data_dict, separators=(',', ':')).encode('utf-8')
         if len(app_data_bytes) > MAX_ANNOUNCE_SIZE:
              app_data_dict["desc"] = ""
-             app_data_bytes = json.dumps(app_data_dict).encode('utf-8')
+             app_data_bytes = json.dumps(app_data_dict, separators=(',', ':')).encode('utf-8')
+        while len(app_data_bytes) > MAX_ANNOUNCE_SIZE and app_data_dict["name"]:
+             # Capabilities and fingerprint must survive; shorten the name instead
+             app_data_dict["name"] = app_data_dict["name"][:-1]
+             app_data_bytes = json.dumps(app_data_dict, separators=(',', ':')).encode('utf-8')
+        return app_data_bytes
 
-        def announce_task():
-            if not self.running: return
-            try:
-                self.service_destination.announce(app_data=app_data_bytes)
-            except Exception as e:
-                log.error(f"Error during announcement: {e}")
-            finally:
-                if self.running: 
-                    self._announce_timer = threading.Timer(interval, announce_task)
-                    self._announce_timer.daemon = True
-                    self._announce_timer.start()
-        announce_task() 
+    def _start_announcing(self):
+        max_interval = self.server_config.get('announce_interval_sec', 900)
+        if max_interval <= 0: return
+
+        def announce():
+            self.service_destination.announce(app_data=self._announce_data())
+
+        self._announcer = AnnounceScheduler(
+            announce,
+            min_interval=self.server_config.get('announce_min_sec', 15),
+            max_interval=max_interval,
+            jitter=self.server_config.get('announce_jitter', 0.1)
+        )
+        # A changed catalog is announced at once, so clients holding its listing know to refresh
+        self.catalog.add_listener(lambda added, removed, changed: self._announcer.trigger())
+        self._announcer.start()
 
     def _start_discovery_listener(self):
         # Access discovery aspect from app_config to avoid KeyError
@@ -114,55 +171,205 @@ class AkitaWAISServer:
         server_hash_hex = R.prettyhexrep(announced_identity.hash)
         try:
             info = json.loads(app_data.decode('utf-8'))
-            with self._lock:
-                self._server_peers[server_hash_hex] = {
-                    "name": info.get("name", f"Server {server_hash_hex[:6]}"),
-                    "description": info.get("desc", ""),
-                    "hash": server_hash_hex,
-                    "last_seen": time.time()
-                }
+            self._server_peers.update(server_hash_hex, {
+                "name": info.get("name", f"Server {server_hash_hex[:6]}"),
+                "description": info.get("desc", ""),
+                "hash": server_hash_hex
+            })
         except Exception:
             pass
 
     def _link_established(self, link):
         log.info(f"Link established from {R.prettyhexrep(link.destination.hash)}")
-        link.set_resource_strategy(R.Resource.ACCEPT_ALL)
+        link.set_resource_strategy(R.Link.ACCEPT_ALL)
         link.set_resource_timeout(15) 
         link.set_request_handler(self._handle_request)
+        link.set_link_closed_callback(self._link_closed)
+
+    def _link_closed(self, link):
+        with self._lock:
+            pacer = self._pacers.pop(link.hash, None)
+        self._binary_links.discard(link.hash)
+        if pacer:
+            log.info(f"Link closed: {pacer.stats()}")
+
+    def _pacer_for(self, link):
+        with self._lock:
+            pacer = self._pacers.get(link.hash)
+            if not pacer:
+                pacer = LinkPacer(
+                    link,
+                    initial_window=self.server_config.get('pacing_initial_window', 4),
+                    max_window=self.server_config.get('pacing_max_window', 64)
+                )
+                self._pacers[link.hash] = pacer
+            return pacer
+
+    def _link_bps(self, link):
+        """Bytes/s the link is expected to carry, for weighing compression CPU against airtime."""
+        try:
+            rate = link.get_expected_rate()     # bits/s, once RNS has measured the link
+            if rate: return rate / 8
+        except Exception:
+            pass
+        stats = self._pacer_for(link).stats()
+        if stats["delivered"] and stats["rate_pps"]:
+            return stats["rate_pps"] * getattr(link, 'MDU', 384)
+        return self.server_config.get('compression_reference_bps', 1000)
+
+    def pacing_stats(self):
+        """Per-link send window and the rate each link has settled at."""
+        with self._lock:
+            pacers = list(self._pacers.values())
+        return [p.stats() for p in pacers]
+
+    def _encode(self, link, message):
+        # Answer in the encoding the client last spoke on this link
+        return wire.dumps(message, binary=link.hash in self._binary_links)
+
+    def _respond(self, link, request_id, message):
+        link.respond(request_id, self._encode(link, message))
 
     def _handle_request(self, link, request_id, data):
         try:
-            request = json.loads(data.decode('utf-8'))
+            # Replies follow the encoding of the latest request, so a JSON-only tool can share the link
+            if wire.is_binary(data):
+                self._binary_links.add(link.hash)
+            else:
+                self._binary_links.discard(link.hash)
+            request = wire.loads(data)
             action = request.get("action")
             
             if action == ACTION_LIST:
-                files = os.listdir(self.server_config['data_dir'])
-                files = [f for f in files if not f.startswith('.')]
-                link.respond(request_id, json.dumps({"status": STATUS_OK, "files": files}).encode('utf-8'))
+                self._handle_list_request(link, request_id, request)
 
             elif action == ACTION_GET:
-                filename = request.get("filename")
-                self._handle_get_request(link, request_id, filename)
+                self._handle_get_request(link, request_id, request)
+
+            elif action == ACTION_MANIFEST:
+                self._handle_manifest_request(link, request_id, request)
+
+            elif action == ACTION_STAT:
+                self._handle_stat_request(link, request_id, request)
 
             elif action == ACTION_SEARCH:
-                query = request.get("query", "").lower()
-                files = os.listdir(self.server_config['data_dir'])
-                results = [f for f in files if query in f.lower() and not f.startswith('.')]
-                link.respond(request_id, json.dumps({"status": STATUS_OK, "results": results}).encode('utf-8'))
+                self._handle_search_request(link, request_id, request)
 
             elif action == ACTION_PEER_LIST:
-                 with self._lock:
-                     peers = list(self._server_peers.values())
-                 link.respond(request_id, json.dumps({"status": STATUS_OK, "peers": peers}).encode('utf-8'))
+                 # Most recently seen first; a large mesh is capped rather than sent whole
+                 peers = self._server_peers.recent(min(int(request.get("limit") or 100), 1000))
+                 self._respond(link, request_id, {"status": STATUS_OK, "peers": peers})
 
             else:
-                link.respond(request_id, json.dumps({"status": STATUS_ERROR, "message": "Unknown action"}).encode('utf-8'))
+                self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Unknown action"})
 
         except Exception as e:
             log.error(f"Error handling request: {e}")
-            link.respond(request_id, json.dumps({"status": STATUS_ERROR, "message": "Internal error"}).encode('utf-8'))
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Internal error"})
+
+    def _handle_list_request(self, link, request_id, request):
+        max_bytes = int(request.get("max_bytes") or self.server_config.get('list_chunk_bytes', 4096))
+        if request.get("since_version") is not None:
+            delta = self.catalog.changes_since(request["since_version"])
+            if delta is not None:
+                version, etag, added, removed, changed = delta
+                payload = self._encode(link, {
+                    "status": STATUS_OK, "version": version, "etag": etag,
+                    "added": added, "removed": removed, "changed": changed
+                })
+                # A delta bigger than one chunk is no cheaper than the (chunked) snapshot
+                if len(payload) <= max_bytes:
+                    link.respond(request_id, payload)
+                    return
+
+        version, etag, files = self.catalog.snapshot()
+        if "offset" not in request:
+            # Legacy clients expect the whole list in one response
+            self._respond(link, request_id, {"status": STATUS_OK, "files": files, "version": version, "etag": etag})
+            return
+
+        # Chunked: as many names from offset as fit in max_bytes; the client follows next_offset
+        offset = max(0, int(request.get("offset") or 0))
+        end, used = offset, 80     # room for the envelope fields
+        while end < len(files):
+            used += len(files[end].encode('utf-8')) + 3
+            if used > max_bytes and end > offset: break
+            end += 1
+
+        def encode(stop):
+            return self._encode(link, {
+                "status": STATUS_OK,
+                "files": files[offset:stop],
+                "total": len(files),
+                "offset": offset,
+                "next_offset": stop if stop < len(files) else None,
+                "version": version,
+                "etag": etag,
+                "full": True
+            })
+
+        payload = encode(end)
+        while len(payload) > max_bytes and end > offset + 1:
+            end -= 1
+            payload = encode(end)
+        link.respond(request_id, payload)
+
+    def _handle_search_request(self, link, request_id, request):
+        # Results depend only on the catalog, so a client holding them under the current etag keeps them
+        etag = self.catalog.etag
+        if request.get("etag") == etag:
+            self._respond(link, request_id, {"status": STATUS_OK, "etag": etag, "unchanged": True})
+            return
+
+        page_size = self.server_config.get('search_page_size', 20)
+        try:
+            offset = max(0, int(request.get("offset") or 0))
+            limit = max(1, min(int(request.get("limit") or page_size), 200))
+            max_bytes = None if request.get("max_bytes") is None else int(request["max_bytes"])
+        except (TypeError, ValueError):
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Invalid offset or limit"})
+            return
+        total, hits = self.search_index.search(request.get("query", ""), offset=offset, limit=limit)
+
+        # Trim the page so the response fits the requested budget (default: one link MDU)
+        if max_bytes is None and self.server_config.get('search_fit_mdu', True):
+            max_bytes = getattr(link, 'MDU', 384)
 
-    def _handle_get_request(self, link, request_id, filename):
+        want_digests = bool(request.get("digests"))
+
+        def encode(page):
+            next_offset = offset + len(page)
+            response = {
+                "status": STATUS_OK,
+                "results": [name for name, _ in page],
+                "total": total,
+                "offset": offset,
+                "next_offset": next_offset if next_offset < total else None,
+                "etag": etag
+            }
+            if want_digests:
+                response["digests"] = [self._cached_digest(name) for name, _ in page]
+            return self._encode(link, response)
+
+        payload = encode(hits)
+        if max_bytes:
+            while len(payload) > max_bytes and len(hits) > 1:
+                hits = hits[:-1]
+                payload = encode(hits)
+        link.respond(request_id, payload)
+
+    def _cached_digest(self, name):
+        """Truncated SHA-256 of name if the transfer cache already knows it; never hashes on the request path."""
+        entry = self.catalog.get(name)
+        record = self.transfer_cache.lookup(entry, touch=False) if entry else None
+        if not record or not record.get("sha256"): return None
+        return record["sha256"][:SEARCH_DIGEST_HEX]
+
+    def _resolve_entry(self, link, request_id, filename):
+        """Looks filename up in the catalog, responding with an error and returning None on failure."""
+        if not filename:
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "File not found"})
+            return None
         filepath = os.path.join(self.server_config['data_dir'], filename)
         
         # Security check: prevent path traversal and ensure file is inside data_dir
@@ -170,8 +377,8 @@ class AkitaWAISServer:
         filepath_abs = os.path.abspath(filepath)
         # Ensure filename is not a path (no directory traversal)
         if os.path.basename(filename) != filename:
-            link.respond(request_id, json.dumps({"status": STATUS_ERROR, "message": "Invalid filename"}).encode('utf-8'))
-            return
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Invalid filename"})
+            return None
 
         # Use commonpath to ensure the file is inside the data directory
         try:
@@ -180,82 +387,312 @@ class AkitaWAISServer:
             common = ''
 
         if common != data_dir_abs:
-            link.respond(request_id, json.dumps({"status": STATUS_ERROR, "message": "Access denied"}).encode('utf-8'))
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Access denied"})
+            return None
+
+        # Served from the in-memory catalog; no stat calls on the request path
+        entry = self.catalog.get(filename)
+        if not entry:
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "File not found"})
+            return None
+        return entry
+
+    def _handle_get_request(self, link, request_id, request):
+        entry = self._resolve_entry(link, request_id, request.get("filename"))
+        if not entry: return
+
+        self._submit_transfer(link, request_id, self._process_and_send_file, link, request_id, entry, request)
+
+    def _submit_transfer(self, link, request_id, fn, *args):
+        """Queues fn on the transfer executor, or answers busy with a retry hint when the queue is full."""
+        def run_if_connected():
+            # The client may have gone away while the job was queued
+            if link.status == R.Link.ACTIVE: fn(*args)
+
+        if self.transfer_executor.submit(link.hash, run_if_connected): return
+        retry_after = self.transfer_executor.retry_after()
+        log.warning(f"Transfer queue full ({self.transfer_executor.stats()}); asking client to retry after {retry_after}s")
+        self._respond(link, request_id, {
+            "status": STATUS_BUSY,
+            "retry_after": retry_after,
+            "message": f"Server busy, retry after {retry_after} s"
+        })
+
+    def _handle_manifest_request(self, link, request_id, request):
+        entry = self._resolve_entry(link, request_id, request.get("filename"))
+        if not entry: return
+
+        def build_and_respond():
+            try:
+                block_size = self.server_config.get('manifest_block_kb', 256) * 1024
+                manifest = self.transfer_cache.manifest(entry, block_size)
+                response = dict(manifest, status=STATUS_OK, filename=entry.name)
+                self._respond(link, request_id, response)
+            except Exception as e:
+                log.error(f"Error building manifest for {entry.name}: {e}")
+                self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Internal error"})
+
+        # Hashing a large file on a cache miss must not block the request handler
+        self._submit_transfer(link, request_id, build_and_respond)
+
+    def _handle_stat_request(self, link, request_id, request):
+        entry = self._resolve_entry(link, request_id, request.get("filename"))
+        if not entry: return
+
+        def respond(sha256):
+            self._respond(link, request_id, {
+                "status": STATUS_OK, "filename": entry.name, "size": entry.size,
+                "mtime": entry.mtime_ns // 1000000000, "sha256": sha256
+            })
+
+        record = self.transfer_cache.lookup(entry, touch=False)
+        if record and record.get("sha256"):
+            respond(record["sha256"])
+            return
+
+        def hash_and_respond():
+            try:
+                respond(self._file_digest(entry))
+            except Exception as e:
+                log.error(f"Error hashing {entry.name}: {e}")
+                self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Internal error"})
+
+        self._submit_transfer(link, request_id, hash_and_respond)
+
+    def _process_and_send_file(self, link, request_id, entry, request):
+        filename = entry.name
+        mode = MODE_RESOURCE if request.get("mode") == MODE_RESOURCE else MODE_PACKETS
+        try:
+            # Stream id of a multiplexed request; data packets carry it so transfers can share the link
+            sid = request.get("sid")
+            if sid is not None and not (isinstance(sid, int) and 0 <= sid <= 0xFFFF):
+                self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Invalid stream id"})
+                return
+
+            if request.get("offset") is not None:
+                self._send_range(link, request_id, entry, request, mode, sid)
+                return
+
+            if (request.get("tail") or request.get("delta")) and self._send_delta(link, request_id, entry, request, mode, sid):
+                return
+
+            # Digest and compressed artifact come from the transfer cache; only misses cost CPU
+            record, payload = self.transfer_cache.open_payload(entry)
+            accepted = accepted_codecs(request.get("codecs"))
+            if record["compressed"] and not record.get("streamed") and (record.get("codec") or DEFAULT_CODEC) not in accepted:
+                # The artifact's codec is one this client cannot decode (e.g. a pre-codec peer and a bz2 artifact)
+                payload.close()
+                record, payload = self.transfer_cache.open_fallback(entry)
+
+            # Only clients that asked for it get a streamed (unsized, digest-in-trailer) transfer
+            can_stream = bool(request.get("stream")) and mode != MODE_RESOURCE
+            if record.get("streamed") and not can_stream:
+                # No artifact yet: send the source raw and sized, hashing it first for the meta
+                # (in resource mode RNS still compresses each segment)
+                record = dict(record, compressed=False, codec=None, streamed=False,
+                              size=record["original_size"], sha256=self._file_digest(entry))
+
+            if mode == MODE_RESOURCE:
+                meta_response = {
+                    "status": STATUS_FILE_META,
+                    "filename": filename,
+                    "size": record["size"],
+                    "original_size": record["original_size"],
+                    "compressed": record["compressed"],
+                    "codec": record.get("codec"),
+                    "sha256": record["sha256"],
+                    "mode": MODE_RESOURCE,
+                    "message": "File resource follows"
+                }
+                self._send_as_resource(link, request_id, meta_response, payload, auto_compress=not record["compressed"])
+                return
+
+            sink = None
+            stream_codec = None
+            if record.get("streamed"):
+                # The digest is unknown until a full pass, so a streamed send always compresses (trailer carries it)
+                stream_codec = choose(record.get("profile") or {}, self._link_bps(link), accepted) or "zlib1"
+            elif can_stream and not record["compressed"] and record.get("sha256"):
+                # Raw payload (incompressible, or artifact refused): compress on the fly if this link favours it
+                stream_codec = choose(record.get("profile") or {}, self._link_bps(link), accepted)
+            if stream_codec:
+                # Compress and hash in one pass while sending. Compressed size is unknown up front;
+                # the digest follows the data as a trailer. Only a pass in the artifact's codec is kept.
+                if record.get("streamed") and stream_codec == record.get("codec"):
+                    sink = self.transfer_cache.begin_artifact(entry)
+                payload = CompressingReader(payload, codec=stream_codec, sink=sink)
+                record = dict(record, compressed=True, streamed=True, codec=stream_codec, size=None)
+                log.info(f"Streaming {filename} with on-the-fly {stream_codec} compression.")
+
+            try:
+                with payload:
+                    meta_response = {
+                        "status": STATUS_FILE_META,
+                        "filename": filename,
+                        "size": record["size"],
+                        "original_size": record["original_size"],
+                        "compressed": record["compressed"],
+                        "codec": record.get("codec"),
+                        "streamed": bool(record.get("streamed")),
+                        "sha256": record["sha256"],
+                        "sid": sid,
+                        "message": "File data follows"
+                    }
+
+                    self._respond(link, request_id, meta_response)
+                    stats = self._send_packets(link, payload, sid)
+            finally:
+                if stream_codec:
+                    # Keeps the digest/artifact when finished, discards the partial artifact otherwise
+                    self.transfer_cache.complete_stream(entry, payload, sink)
+
+            log.info(f"Sent {filename} (link settled at {stats['rate_pps']} pkt/s, window {stats['window']}, srtt {stats['srtt_ms']} ms)")
+
+        except Exception as e:
+            log.error(f"Error sending file {filename}: {e}", exc_info=True)
+
+    def _file_digest(self, entry):
+        """Full SHA-256 of entry; the manifest pass hashes the file once and caches it with the record."""
+        block_size = self.server_config.get('manifest_block_kb', 256) * 1024
+        return self.transfer_cache.manifest(entry, block_size)["sha256"]
+
+    def _send_range(self, link, request_id, entry, request, mode, sid=None):
+        """Sends bytes [offset, offset+length) of a file, in the codec that pays off best on this link."""
+        offset = int(request.get("offset", 0))
+        length = request.get("length")
+        end = entry.size if length is None else min(entry.size, offset + int(length))
+        end = min(end, offset + MAX_TRANSFER_RAM)
+        if offset < 0 or offset > entry.size or end < offset:
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Invalid range"})
             return
 
-        if not filename or not os.path.exists(filepath) or not os.path.isfile(filepath):
-            link.respond(request_id, json.dumps({"status": STATUS_ERROR, "message": "File not found"}).encode('utf-8'))
+        with open(entry.path, 'rb') as f:
+            f.seek(offset)
+            raw_data = f.read(end - offset)
+        codec = choose(profile(sample_data(raw_data)), self._link_bps(link), accepted_codecs(request.get("codecs")))
+        compressed_data = get_codec(codec).compress(raw_data) if codec else raw_data
+        compressed = len(compressed_data) < len(raw_data)
+        data_to_send = compressed_data if compressed else raw_data
+
+        meta_response = {
+            "status": STATUS_FILE_META,
+            "filename": entry.name,
+            "offset": offset,
+            "length": len(raw_data),
+            "file_size": entry.size,
+            "size": len(data_to_send),
+            "original_size": len(raw_data),
+            "compressed": compressed,
+            "codec": codec if compressed else None,
+            "sha256": calculate_sha256(raw_data),
+            "sid": sid,
+            "message": "Range data follows"
+        }
+        if mode == MODE_RESOURCE:
+            meta_response["mode"] = MODE_RESOURCE
+            self._send_as_resource(link, request_id, meta_response, data_to_send, auto_compress=False)
             return
 
-        # Threaded processing
-        threading.Thread(target=self._process_and_send_file, args=(link, request_id, filepath, filename), daemon=True).start()
+        self._respond(link, request_id, meta_response)
+        self._send_packets(link, io.BytesIO(data_to_send), sid)
+        log.info(f"Sent {entry.name} bytes {offset}-{offset + len(raw_data)}")
 
-    def _process_and_send_file(self, link, request_id, filepath, filename):
+    def _send_delta(self, link, request_id, entry, request, mode, sid=None):
+        """
+        Answers a GET carrying the client's block signature with an rsync-style
+        delta, or a tail GET (length and SHA-256 of the client's copy) with just
+        the appended bytes. Returns False, having sent nothing, when the versions
+        share too little for a delta to beat the plain transfer.
+        """
         try:
-            file_size_original = os.path.getsize(filepath)
-            
-            if file_size_original > MAX_TRANSFER_RAM:
-                log.info(f"File {filename} too large for compression. Streaming raw.")
-                compressed = False
-                
-                # Calculate hash by streaming
-                sha256_hash = hashlib.sha256()
-                with open(filepath, 'rb') as f:
-                    for chunk in iter(lambda: f.read(65536), b""):
-                        sha256_hash.update(chunk)
-                sha256 = sha256_hash.hexdigest()
-                
-                data_size = file_size_original
-                data_to_send = None # Indicates streaming
+            if request.get("tail"):
+                tail = request["tail"]
+                block_size = int(tail["length"])
+                result = tail_delta(entry.path, entry.size, block_size, tail["sha256"], MAX_TRANSFER_RAM)
             else:
-                with open(filepath, 'rb') as f:
-                    raw_data = f.read()
-                
-                compressed_data = zlib.compress(raw_data, level=6)
-                
-                if len(compressed_data) < len(raw_data):
-                    data_to_send = compressed_data
-                    compressed = True
-                    log.info(f"Compressed {filename}: {(len(compressed_data)/len(raw_data))*100:.1f}% of original")
-                else:
-                    data_to_send = raw_data
-                    compressed = False
-                
-                sha256 = calculate_sha256(raw_data if compressed else data_to_send)
-                data_size = len(data_to_send)
-
-            meta_response = {
-                "status": STATUS_FILE_META,
-                "filename": filename,
-                "size": data_size,
-                "original_size": file_size_original,
-                "compressed": compressed,
-                "sha256": sha256,
-                "message": "File data follows"
-            }
-            
-            link.respond(request_id, json.dumps(meta_response).encode('utf-8'))
+                block_size = request["delta"]["block_size"]
+                max_literal = min(int(entry.size * self.server_config.get('delta_max_literal_ratio', 0.5)), MAX_TRANSFER_RAM)
+                result = compute_delta(entry.path, request["delta"], max_literal)
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning(f"Ignoring delta request for {entry.name}: {e}")
+            return False
+        if result is None:
+            log.info(f"{entry.name} is not a cheap {'tail' if request.get('tail') else 'delta'} of the client's copy; sending it whole.")
+            return False
 
-            # Send Data chunks
-            chunk_size = getattr(link, 'MDU', 384) # Use Link MDU if available, fallback to 384
-            
-            if data_to_send is not None:
-                # Send from memory
-                for i in range(0, len(data_to_send), chunk_size):
-                    if link.status != R.Link.ACTIVE: break
-                    chunk = data_to_send[i:i+chunk_size]
-                    link.send(chunk)
-                    time.sleep(0.005)
-            else:
-                # Stream from disk
-                with open(filepath, 'rb') as f:
-                    while link.status == R.Link.ACTIVE:
-                        chunk = f.read(chunk_size)
-                        if not chunk: break
-                        link.send(chunk)
-                        time.sleep(0.005)
-            
-            log.info(f"Sent {filename}")
+        ops, sha256 = result
+        codec = choose(profile(sample_data(ops)), self._link_bps(link), accepted_codecs(request.get("codecs")))
+        compressed_data = get_codec(codec).compress(ops) if codec else ops
+        compressed = len(compressed_data) < len(ops)
+        data_to_send = compressed_data if compressed else ops
+
+        meta_response = {
+            "status": STATUS_FILE_META,
+            "filename": entry.name,
+            "delta": True,
+            "tail": bool(request.get("tail")),
+            "block_size": block_size,
+            "file_size": entry.size,
+            "file_sha256": sha256,
+            "size": len(data_to_send),
+            "original_size": len(ops),
+            "compressed": compressed,
+            "codec": codec if compressed else None,
+            "sha256": calculate_sha256(ops),
+            "sid": sid,
+            "message": "Delta follows"
+        }
+        if mode == MODE_RESOURCE:
+            meta_response["mode"] = MODE_RESOURCE
+            self._send_as_resource(link, request_id, meta_response, data_to_send, auto_compress=False)
+        else:
+            self._respond(link, request_id, meta_response)
+            self._send_packets(link, io.BytesIO(data_to_send), sid)
+        log.info(f"Sent {entry.name} as a {len(data_to_send)} byte delta ({entry.size} bytes whole)")
+        return True
 
+    def _send_packets(self, link, payload, sid=None):
+        """Sends payload as MDU-sized link packets, paced by the link's AIMD window."""
+        chunk_size = getattr(link, 'MDU', 384) # Use Link MDU if available, fallback to 384
+        header = b""
+        if sid is not None:
+            # Multiplexed stream: each packet is prefixed with its stream id
+            header = STREAM_HEADER.pack(sid)
+            chunk_size -= len(header)
+        pacer = self._pacer_for(link)
+
+        while link.status == R.Link.ACTIVE:
+            chunk = payload.read(chunk_size)
+            if not chunk: break
+            pacer.acquire()
+            pacer.on_sent(link.send(header + chunk))
+        return pacer.stats()
+
+    def _send_as_resource(self, link, request_id, meta_response, payload, auto_compress=False):
+        """Sends the payload as an RNS.Resource, which handles windowing, segmentation and retransmits."""
+        self._respond(link, request_id, meta_response)
+
+        concluded = threading.Event()
+        started = time.time()
+        resource = None
+        try:
+            resource = R.Resource(
+                payload, link,
+                metadata={"rid": request_id, "filename": meta_response["filename"]},
+                auto_compress=auto_compress,
+                callback=lambda r: concluded.set()
+            )
+            # Hold this worker until RNS finishes or gives up on the resource
+            concluded.wait(timeout=self.server_config.get('resource_timeout_sec', 3600))
         except Exception as e:
-            log.error(f"Error sending file {filename}: {e}", exc_info=True)
+            log.error(f"Could not send {meta_response['filename']} as resource: {e}")
+        finally:
+            if hasattr(payload, 'close'): payload.close()
+        if resource is None:
+            # The client already has the meta; this error ends its pending request
+            self._respond(link, request_id, {"status": STATUS_ERROR, "message": "Resource transfer failed"})
+            return
+        if resource.status == R.Resource.COMPLETE:
+            log.info(f"Sent {meta_response['filename']} as resource in {time.time() - started:.1f}s")
+        else:
+            log.warning(f"Resource transfer of {meta_response['filename']} did not complete (status {resource.status})")
@@ -145,27 +145,50 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Download file logic
+    // Download file logic: queue a job, follow its progress over SSE, then fetch the file
     async function downloadFile(filename) {
         showToast(`Requesting ${filename}...`);
         try {
-            const res = await fetch('/api/download', {
+            const res = await fetch('/api/jobs', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ filename })
             });
             const data = await res.json();
-            
-            if (data.status === 'ok') {
-                showToast(`Download complete: ${filename}`);
-            } else {
-                showToast(`Download failed: ${data.message}`);
+
+            if (res.status !== 202) {
+                showToast(`Download failed: ${data.message || data.error}`);
+                return;
             }
+            followJob(data.job);
         } catch (e) {
             showToast("Network error during download.");
         }
     }
 
+    function followJob(job) {
+        const events = new EventSource(`/api/jobs/${job.id}/events`);
+        events.addEventListener('progress', (e) => {
+            const p = JSON.parse(e.data);
+            if (p.status === 'running' && p.percent !== null) {
+                showToast(`${p.filename}: ${p.percent}% (${(p.rate_bps / 1024).toFixed(1)} KiB/s)`);
+            }
+        });
+        events.addEventListener('done', (e) => {
+            events.close();
+            showToast(`Download complete: ${job.filename}`);
+            const a = document.createElement('a');
+            a.href = `/api/jobs/${job.id}/file`;
+            a.download = job.filename;
+            a.click();
+        });
+        events.addEventListener('failed', (e) => {
+            events.close();
+            showToast(`Download failed: ${JSON.parse(e.data).message}`);
+        });
+        events.onerror = () => events.close();
+    }
+
     // Event Listeners
     btnRefresh.addEventListener('click', refreshServers);
     btnSearch.addEventListener('click', searchFiles);
@@ -0,0 +1,119 @@
+import os
+import json
+import shutil
+import threading
+from .common import client_log as log
+
+INDEX_FILE = "index.json"
+
+
+class ContentStore:
+    """
+    Local content-addressed store of downloaded files, keyed by SHA-256.
+
+    Every verified download is hard-linked into the store (copied where links
+    are not possible), so a later download of the same bytes, from any server
+    and under any name, is placed from here instead of crossing the mesh. An
+    object whose size or mtime no longer matches the index was edited through
+    one of its links and is dropped rather than served.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._index = {}     # sha256 -> {size, mtime_ns}
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(self.root, exist_ok=True)
+        except OSError as e:
+            log.error(f"Could not create content store {self.root}: {e}")
+        self._load()
+
+    # --- Persistence ---
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _load(self):
+        try:
+            with open(self._index_path(), 'r') as f:
+                self._index = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.error(f"Content store index unreadable, starting empty: {e}")
+
+    def _save(self):
+        # Caller holds self._lock
+        tmp_path = self._index_path() + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index, f, separators=(',', ':'))
+            os.replace(tmp_path, self._index_path())
+        except OSError as e:
+            log.error(f"Could not save content store index: {e}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    # --- Lookup / placement ---
+
+    def lookup(self, digest, size=None):
+        """Path of the stored object for digest, or None if it is missing, a different size, or was modified."""
+        with self._lock:
+            record = self._index.get(digest)
+            if record is None or (size is not None and record["size"] != size): return None
+            path = self._object_path(digest)
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is None or st.st_size != record["size"] or st.st_mtime_ns != record["mtime_ns"]:
+                del self._index[digest]
+                self._save()
+                return None
+            return path
+
+    def add(self, path, digest):
+        """Records the verified file at path under digest."""
+        obj_path = self._object_path(digest)
+        with self._lock:
+            if digest in self._index and os.path.exists(obj_path): return
+            try:
+                os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+                self._link_or_copy(path, obj_path)
+                st = os.stat(obj_path)
+            except OSError as e:
+                log.warning(f"Could not add {path} to the content store: {e}")
+                return
+            self._index[digest] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            self._save()
+
+    def place(self, digest, dest_path, size=None):
+        """Links or copies the stored object for digest to dest_path; False if the store does not hold it."""
+        obj_path = self.lookup(digest, size)
+        if obj_path is None: return False
+        if os.path.exists(dest_path) and os.path.samefile(obj_path, dest_path): return True
+        tmp_path = f"{dest_path}.{os.getpid()}.store.tmp"
+        try:
+            self._link_or_copy(obj_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+        except OSError as e:
+            log.warning(f"Could not place {digest[:16]} at {dest_path}: {e}")
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            return False
+        return True
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        if os.path.exists(dst): os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            # Other filesystem, or links unsupported; copy2 keeps the mtime the index checks
+            tmp_path = dst + ".copy"
+            shutil.copy2(src, tmp_path)
+            os.replace(tmp_path, dst)
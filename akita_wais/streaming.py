@@ -0,0 +1,173 @@
+import os
+import hashlib
+from .compression import get_codec
+
+# A streamed transfer is a compressed stream followed by this trailer. The SHA-256
+# of the original bytes is only known once the whole file has been read, so it
+# travels after the data instead of in the file meta.
+TRAILER_MAGIC = b"AKWT"
+TRAILER_SIZE = len(TRAILER_MAGIC) + 32
+
+
+class CompressingReader:
+    """
+    File-like wrapper that compresses (with the named codec) and hashes src in a single pass.
+
+    read() returns the wire bytes of a streamed transfer (compressed data, then
+    the trailer). Memory use is bounded by read_size regardless of file size. The
+    compressed bytes are also copied to sink when one is given, which lets the
+    transfer cache keep the artifact produced by the first send.
+    """
+
+    def __init__(self, src, codec=None, sink=None, read_size=65536):
+        self._src = src
+        self.codec = get_codec(codec).name
+        self._compressor = get_codec(codec).compressobj()
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._read_size = read_size
+        self.sink = sink
+        self.raw_size = 0
+        self.compressed_size = 0
+        self.sha256 = None
+
+    @property
+    def finished(self):
+        return self.sha256 is not None
+
+    def _emit(self, data):
+        if not data: return
+        self.compressed_size += len(data)
+        if self.sink: self.sink.write(data)
+        self._buffer.extend(data)
+
+    def _fill(self):
+        data = self._src.read(self._read_size)
+        if data:
+            self.raw_size += len(data)
+            self._hash.update(data)
+            self._emit(self._compressor.compress(data))
+        else:
+            self._emit(self._compressor.flush())
+            digest = self._hash.digest()
+            self.sha256 = digest.hex()
+            self._buffer.extend(TRAILER_MAGIC + digest)
+
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size < 0: size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+    def close(self):
+        self._src.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileReceiver:
+    """
+    Receiving side of a file transfer with constant memory use.
+
+    Wire bytes are inflated incrementally (when the payload is compressed),
+    hashed as they arrive and written to a temp file next to the destination.
+    finalize() verifies the SHA-256 (from the meta, or from the trailer of a
+    streamed transfer) and atomically renames the temp file into place.
+    """
+
+    def __init__(self, dest_path, meta, sink=None):
+        self.dest_path = dest_path
+        self.meta = meta
+        self.streamed = bool(meta.get("streamed"))
+        self.expected_size = meta.get("size")
+        self._decompressor = get_codec(meta.get("codec")).decompressobj() if meta.get("compressed") else None
+        self._hash = hashlib.sha256()
+        self._trailer = bytearray()
+        self.received = 0
+        self.written = 0
+
+        if sink is not None:
+            # Caller-provided sink (e.g. a ranged GET buffered for block verification)
+            self.tmp_path = None
+            self._file = sink
+            return
+        # Same directory as the destination so the final rename is atomic
+        dest_dir = os.path.dirname(os.path.abspath(dest_path))
+        self.tmp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.{os.getpid()}.{id(self):x}.tmp")
+        self._file = open(self.tmp_path, 'wb')
+
+    @property
+    def done(self):
+        if self.streamed:
+            return self._decompressor.eof and len(self._trailer) >= TRAILER_SIZE
+        return self.received >= self.expected_size
+
+    def feed(self, data):
+        self.received += len(data)
+        if self._decompressor is None:
+            self._write(data)
+            return
+        if self._decompressor.eof:
+            self._trailer.extend(data)
+            return
+        try:
+            out = self._decompressor.decompress(data)
+        except Exception:
+            raise Exception("Decompression failed. Data corrupted.")
+        self._write(out)
+        if self._decompressor.eof:
+            self._trailer.extend(self._decompressor.unused_data)
+
+    def _write(self, data):
+        if not data: return
+        self._hash.update(data)
+        self._file.write(data)
+        self.written += len(data)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def _expected_digests(self):
+        digests = [self.meta.get("sha256")]
+        if self.streamed:
+            trailer = bytes(self._trailer[:TRAILER_SIZE])
+            if not trailer.startswith(TRAILER_MAGIC):
+                raise Exception("Stream trailer missing or corrupt.")
+            digests.append(trailer[len(TRAILER_MAGIC):].hex())
+        return [d for d in digests if d]
+
+    def finalize(self):
+        """Verifies the received data and moves it to dest_path. Raises on any mismatch."""
+        try:
+            if self.tmp_path: self._file.close()
+            if self._decompressor is not None and not self._decompressor.eof:
+                raise Exception("Decompression failed. Data corrupted.")
+            for expected in self._expected_digests():
+                if expected != self.sha256:
+                    raise Exception(f"Integrity Mismatch! Server: {expected}, Recv: {self.sha256}")
+            if self.tmp_path: os.replace(self.tmp_path, self.dest_path)
+        except Exception:
+            self.abort()
+            raise
+        return self.written
+
+    def suspend(self):
+        """Stops receiving and returns the temp file path holding the bytes written so far."""
+        if not self.tmp_path: return None
+        self._file.close()
+        return self.tmp_path
+
+    def abort(self):
+        if not self.tmp_path: return
+        if not self._file.closed: self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
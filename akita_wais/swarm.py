@@ -0,0 +1,130 @@
+import time
+import threading
+from collections import deque
+from .common import client_log as log, STATUS_OK, CAP_RANGE, SEARCH_DIGEST_HEX
+
+
+class SwarmDownload:
+    """
+    Fetches one file from several servers that hold identical content.
+
+    The missing blocks of a PartialDownload are cut into block-aligned ranges
+    and shared through a single work queue. Every source has a worker that
+    takes the next range as soon as its previous one lands, so fast sources
+    take on most of the work. When the queue runs dry, idle workers also
+    request ranges still in flight on slower sources ("endgame"); the first
+    copy to verify wins. Every range is checked against the manifest's block
+    digests before it is written. A source that fails max_failures times in a
+    row is dropped, and its ranges go back into the queue.
+    """
+
+    MAX_COPIES = 2   # sources working on the same range at once during the endgame
+
+    def __init__(self, fetch_range, partial, sources, range_bytes, max_failures=3):
+        self._fetch_range = fetch_range    # (server_info, filename, offset, length) -> response
+        self.partial = partial
+        self.sources = sources             # [(server_info, filename on that server)]
+        self.max_failures = max_failures
+        self._queue = deque(partial.missing_ranges(range_bytes))
+        self._in_flight = {}               # (offset, length) -> {"started", "sources"}
+        self._done = set()
+        self._cond = threading.Condition()
+        self.stats = {s["hash"]: {"name": s.get("name"), "bytes": 0, "seconds": 0.0, "ranges": 0, "failures": 0}
+                      for s, _ in sources}
+
+    def run(self):
+        """Downloads every missing range; returns True if all blocks verified."""
+        total = len(self._queue)
+        log.info(f"Swarm download of {self.partial.state['filename']}: {total} ranges from {len(self.sources)} sources")
+        workers = [threading.Thread(target=self._worker, args=source, daemon=True) for source in self.sources]
+        for worker in workers: worker.start()
+        for worker in workers: worker.join()
+        for stat in self.stats.values():
+            rate = stat["bytes"] / stat["seconds"] / 1024 if stat["seconds"] else 0
+            log.info(f"  {stat['name']}: {stat['ranges']} ranges, {stat['bytes']} bytes, {rate:.1f} KiB/s")
+        return self.partial.complete
+
+    def _next_range(self, server_hash):
+        # Caller holds self._cond
+        while True:
+            if self._queue:
+                unit = self._queue.popleft()
+                self._in_flight[unit] = {"started": time.time(), "sources": {server_hash}}
+                return unit
+            if not self._in_flight: return None
+            # Endgame: help with the oldest range another source is still working on
+            candidates = [(f["started"], u) for u, f in self._in_flight.items()
+                          if server_hash not in f["sources"] and len(f["sources"]) < self.MAX_COPIES]
+            if candidates:
+                unit = min(candidates)[1]
+                self._in_flight[unit]["sources"].add(server_hash)
+                return unit
+            self._cond.wait(1.0)
+
+    def _worker(self, server_info, filename):
+        server_hash = server_info["hash"]
+        stat = self.stats[server_hash]
+        failures = 0
+        while True:
+            with self._cond:
+                unit = self._next_range(server_hash)
+            if unit is None: return
+
+            offset, length = unit
+            started = time.time()
+            res = self._fetch_range(server_info, filename, offset, length)
+            elapsed = time.time() - started
+
+            with self._cond:
+                flight = self._in_flight.get(unit)
+                if flight: flight["sources"].discard(server_hash)
+                ok = res.get("status") == STATUS_OK
+                if ok and unit in self._done:
+                    pass  # another source delivered this range first
+                elif ok:
+                    bad = self.partial.write_range(res["offset"], res["data"])
+                    ok = bad == 0
+                    if bad: log.warning(f"{bad} blocks from {stat['name']} failed verification")
+
+                if ok:
+                    failures = 0
+                    if unit not in self._done:
+                        stat["bytes"] += length
+                        stat["seconds"] += elapsed
+                        stat["ranges"] += 1
+                        self._done.add(unit)
+                        self._in_flight.pop(unit, None)
+                else:
+                    failures += 1
+                    stat["failures"] += 1
+                    if unit not in self._done and flight is not None and not flight["sources"]:
+                        # Nobody else is on it; hand it back to the queue
+                        self._in_flight.pop(unit, None)
+                        self._queue.appendleft(unit)
+                self._cond.notify_all()
+
+                if failures >= self.max_failures:
+                    log.warning(f"Dropping swarm source {stat['name']}: {res.get('message')}")
+                    return
+
+
+def find_sources(client, filename, manifest, primary, max_sources):
+    """
+    The primary server plus other discovered servers that advertise the same
+    content digest for filename, as [(server_info, filename on that server)].
+    """
+    sources = [(primary, filename)]
+    digest = manifest["sha256"][:SEARCH_DIGEST_HEX]
+    res = client.search_all(filename.rsplit("/", 1)[-1])
+    if res.get("status") != STATUS_OK: return sources
+
+    for result in res.get("results", []):
+        if result.get("sha256") != digest: continue
+        for holder in result["servers"]:
+            if len(sources) >= max_sources: return sources
+            if holder["hash"] == primary["hash"]: continue
+            server_info = client._target(holder["hash"])
+            if server_info and CAP_RANGE in server_info.get("caps", []):
+                sources.append((server_info, holder["name_on_server"]))
+    return sources
+
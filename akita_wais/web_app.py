@@ -1,9 +1,14 @@
 import os
-from flask import Flask, jsonify, request, render_template, send_from_directory
-from .common import common_log
+import json
+import time
+from flask import Flask, Response, jsonify, request, render_template, send_file, send_from_directory
+from .common import common_log, STATUS_OK
+from .federation import SearchMerger
+from .jobs import DownloadJobs, JOB_DONE, JOB_FAILED
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 client_instance = None
+download_jobs = None
 
 @app.route('/')
 def index():
@@ -37,28 +42,102 @@ def connect_server():
 
 @app.route('/api/files', methods=['GET'])
 def list_files():
-    res = client_instance.get_server_list()
+    res = client_instance.get_server_list(server=request.args.get('server'))
     return jsonify(res)
 
 @app.route('/api/search', methods=['GET'])
 def search_files():
     query = request.args.get('q', '')
-    res = client_instance.search_files(query)
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', None, type=int)
+    res = client_instance.search_files(query, offset=offset, limit=limit, server=request.args.get('server'))
     return jsonify(res)
 
+@app.route('/api/search/all', methods=['GET'])
+def search_all_servers():
+    """Federated search, streamed as NDJSON: one line per server as it answers, then the merged results."""
+    query = request.args.get('q', '')
+    top_n = request.args.get('top', None, type=int)
+    deadline = request.args.get('deadline', None, type=float)
+    limit = request.args.get('limit', None, type=int)
+
+    def generate():
+        merger = SearchMerger()
+        for server_info, res in client_instance.iter_search_all(query, top_n=top_n, deadline=deadline, limit=limit):
+            ok = res.get("status") == STATUS_OK
+            merger.add_response(server_info, res)
+            update = {"server": server_info['hash'], "name": server_info.get('name'), "status": res.get("status"),
+                      "count": len(res.get("results", [])) if ok else 0, "message": res.get("message")}
+            yield json.dumps(update) + "\n"
+        yield json.dumps({"done": True, "results": merger.results()}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/download', methods=['POST'])
+@app.route('/api/jobs', methods=['POST'])
 def download_file():
+    """Queues a background download job; progress via /api/jobs/<id>/events, file via /api/jobs/<id>/file."""
     data = request.json
     filename = data.get('filename')
     if not filename:
         return jsonify({"error": "Filename is required"}), 400
-        
-    res = client_instance.get_file(filename)
-    return jsonify(res)
+
+    job = download_jobs.submit(filename, server=data.get('server'), swarm=data.get('swarm'))
+    if not job:
+        return jsonify({"status": "error", "message": "Too many download jobs; try again later"}), 429
+    return jsonify({"status": "queued", "job": job}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({"jobs": [download_jobs.snapshot(j["id"]) for j in download_jobs.list()]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = download_jobs.snapshot(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events: a progress snapshot whenever it changes (at most twice a second) until the job ends."""
+    if not download_jobs.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        last = None
+        last_sent = 0
+        while True:
+            job = download_jobs.snapshot(job_id)
+            if job is None: break
+            payload = json.dumps(job)
+            if payload != last or time.time() - last_sent > 15:
+                # Unchanged snapshots are still resent now and then as a keep-alive
+                yield f"event: progress\ndata: {payload}\n\n"
+                last, last_sent = payload, time.time()
+            if job["status"] in (JOB_DONE, JOB_FAILED):
+                yield f"event: {job['status']}\ndata: {payload}\n\n"
+                break
+            time.sleep(0.5)
+
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/jobs/<job_id>/file', methods=['GET'])
+def job_file(job_id):
+    path = download_jobs.file_path(job_id)
+    if not path or not os.path.exists(path):
+        return jsonify({"error": "File not available"}), 404
+    # conditional=True makes Werkzeug answer Range/If-Range requests with 206 partial content
+    return send_file(os.path.abspath(path), as_attachment=True, conditional=True)
 
 def start_server(client, host='0.0.0.0', port=5000):
-    global client_instance
+    global client_instance, download_jobs
     client_instance = client
+    download_jobs = DownloadJobs(
+        client,
+        max_parallel=client.client_config.get('web_download_workers', 2),
+        max_jobs=client.client_config.get('web_max_jobs', 100)
+    )
     common_log.info(f"Starting Web UI on http://{host}:{port}")
     # Disable flask reloader in threaded context to prevent crashes
-    app.run(host=host, port=port, debug=False, use_reloader=False)
+    app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
@@ -0,0 +1,181 @@
+import json
+import struct
+
+# Compact binary encoding for request/response messages.
+#
+# A binary message is MAGIC followed by one encoded value (normally a dict).
+# JSON messages always start with '{', so both encodings can share a link and
+# the receiver tells them apart by the first byte. Values are type-tagged:
+# integers are zigzag varints, strings and bytes are varint length-prefixed,
+# lowercase hex strings (digests) travel as raw bytes, and dict keys and
+# common string values are replaced by one-byte indexes into the tables
+# below. The tables are part of the protocol: only ever append to them.
+
+MAGIC = b"\xa7"
+
+KEYS = [
+    "action", "status", "message", "filename", "files", "results", "total", "offset",
+    "next_offset", "limit", "max_bytes", "query", "digests", "size", "original_size",
+    "compressed", "streamed", "sha256", "sid", "mode", "length", "file_size", "blocks",
+    "block_size", "peers", "name", "hash", "caps", "retry_after", "since_version",
+    "version", "etag", "added", "removed", "changed", "full", "codec", "mtime",
+    "last_seen", "v", "desc", "unchanged", "codecs", "delta", "weak", "strong",
+    "file_sha256", "tail", "stream"
+]
+
+VALUES = [
+    "list", "get", "search", "peer_list", "manifest", "ok", "error", "file_meta",
+    "busy", "packets", "resource", "stat", "zlib1", "zlib6", "zlib9", "bz2", "lzma"
+]
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_BYTES, T_LIST, T_DICT, T_VALUE, T_HEX = range(11)
+
+_KEY_INDEX = {k: i for i, k in enumerate(KEYS)}
+_VALUE_INDEX = {v: i for i, v in enumerate(VALUES)}
+_HEX_CHARS = set("0123456789abcdef")
+_DOUBLE = struct.Struct(">d")
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        if pos >= len(data): raise ValueError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80: return result, pos
+        shift += 7
+
+
+def _put_str(out, s):
+    raw = s.encode('utf-8')
+    _put_varint(out, len(raw))
+    out.extend(raw)
+
+
+def _is_hex(s):
+    return len(s) >= 8 and len(s) % 2 == 0 and set(s) <= _HEX_CHARS
+
+
+def _encode(out, value):
+    if value is None:
+        out.append(T_NONE)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif isinstance(value, int):
+        out.append(T_INT)
+        _put_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+    elif isinstance(value, float):
+        out.append(T_FLOAT)
+        out.extend(_DOUBLE.pack(value))
+    elif isinstance(value, str):
+        if value in _VALUE_INDEX:
+            out.append(T_VALUE)
+            _put_varint(out, _VALUE_INDEX[value])
+        elif _is_hex(value):
+            out.append(T_HEX)
+            _put_varint(out, len(value) // 2)
+            out.extend(bytes.fromhex(value))
+        else:
+            out.append(T_STR)
+            _put_str(out, value)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(T_BYTES)
+        _put_varint(out, len(value))
+        out.extend(value)
+    elif isinstance(value, (list, tuple)):
+        out.append(T_LIST)
+        _put_varint(out, len(value))
+        for item in value:
+            _encode(out, item)
+    elif isinstance(value, dict):
+        out.append(T_DICT)
+        _put_varint(out, len(value))
+        for key, item in value.items():
+            # Even: index into KEYS; odd: inline key string of length n >> 1
+            if key in _KEY_INDEX:
+                _put_varint(out, _KEY_INDEX[key] << 1)
+            else:
+                raw = str(key).encode('utf-8')
+                _put_varint(out, (len(raw) << 1) | 1)
+                out.extend(raw)
+            _encode(out, item)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def _decode(data, pos):
+    kind = data[pos]
+    pos += 1
+    if kind == T_NONE: return None, pos
+    if kind == T_TRUE: return True, pos
+    if kind == T_FALSE: return False, pos
+    if kind == T_INT:
+        n, pos = _get_varint(data, pos)
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+    if kind == T_FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + _DOUBLE.size
+    if kind in (T_STR, T_BYTES, T_HEX):
+        n, pos = _get_varint(data, pos)
+        raw = bytes(data[pos:pos + n])
+        if len(raw) != n: raise ValueError("Truncated string")
+        if kind == T_STR: return raw.decode('utf-8'), pos + n
+        if kind == T_HEX: return raw.hex(), pos + n
+        return raw, pos + n
+    if kind == T_VALUE:
+        n, pos = _get_varint(data, pos)
+        return VALUES[n], pos
+    if kind == T_LIST:
+        count, pos = _get_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if kind == T_DICT:
+        count, pos = _get_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            n, pos = _get_varint(data, pos)
+            if n & 1:
+                key = bytes(data[pos:pos + (n >> 1)]).decode('utf-8')
+                pos += n >> 1
+            else:
+                key = KEYS[n >> 1]
+            result[key], pos = _decode(data, pos)
+        return result, pos
+    raise ValueError(f"Unknown type tag {kind}")
+
+
+def dumps(message, binary=False):
+    """Encodes a message dict as compact JSON, or in the binary encoding when binary is set."""
+    if not binary:
+        return json.dumps(message, separators=(',', ':')).encode('utf-8')
+    out = bytearray(MAGIC)
+    _encode(out, message)
+    return bytes(out)
+
+
+def loads(data):
+    """Decodes a message in either encoding."""
+    if data[:1] == MAGIC:
+        try:
+            value, pos = _decode(data, 1)
+        except (IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"Malformed binary message: {e}")
+        if pos != len(data): raise ValueError("Trailing bytes after binary message")
+        return value
+    return json.loads(data.decode('utf-8'))
+
+
+def is_binary(data):
+    return data[:1] == MAGIC
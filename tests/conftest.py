@@ -0,0 +1,23 @@
+import copy
+import pytest
+from akita_wais.config import DEFAULT_CONFIG
+
+
+@pytest.fixture
+def config(tmp_path):
+    """DEFAULT_CONFIG with every file and directory the client or server writes moved under tmp_path."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["server"].update({
+        "data_dir": str(tmp_path / "data"),
+        "cache_dir": str(tmp_path / "cache"),
+        "peer_cache_path": str(tmp_path / "peers.db")
+    })
+    config["client"].update({
+        "download_dir": str(tmp_path / "downloads"),
+        "store_dir": str(tmp_path / "store"),
+        "server_cache_path": str(tmp_path / "servers.db"),
+        "metadata_cache_path": str(tmp_path / "servers.meta.json")
+    })
+    (tmp_path / "data").mkdir()
+    (tmp_path / "downloads").mkdir()
+    return config
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("RNS")
+
+from akita_wais.async_client import AsyncAkitaWAISClient
+
+SERVER = {"hash": "<00>", "name": "test", "caps": []}
+
+
+class SlowPool:
+    """Connects only once released; counts the leases it hands out."""
+
+    def __init__(self):
+        self.connected = threading.Event()
+        self.returned = threading.Event()
+        self.leases = 0
+
+    def try_acquire(self, server_info):
+        return None
+
+    def acquire(self, server_info):
+        self.leases += 1
+        self.connected.wait(5)
+        return object()
+
+    def release(self, key):
+        self.leases -= 1
+        self.returned.set()
+
+
+def test_cancelled_lease_is_released_when_connect_finishes(config):
+    client = AsyncAkitaWAISClient(config, None)
+    client.pool = SlowPool()
+
+    async def cancel_while_connecting():
+        task = asyncio.ensure_future(client._lease(SERVER))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        client.pool.connected.set()
+        await asyncio.get_running_loop().run_in_executor(None, client.pool.returned.wait, 5)
+
+    asyncio.run(cancel_while_connecting())
+    assert client.pool.leases == 0
@@ -0,0 +1,43 @@
+import zlib
+import pytest
+import akita_wais.cache as cache_module
+from akita_wais.cache import TransferCache
+from akita_wais.catalog import FileCatalog
+from akita_wais.compression import LEGACY_CODECS
+
+
+@pytest.fixture
+def entry(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "readings.csv").write_bytes(b"".join(b"%d,%d,ok\n" % (i, i * 7 % 13) for i in range(5000)))
+    catalog = FileCatalog(str(data_dir))
+    catalog.rescan()
+    return catalog.get("readings.csv")
+
+
+def test_fallback_artifact_is_built_once(tmp_path, entry, monkeypatch):
+    # A very slow reference link makes the best-ratio codec win, which is never zlib here
+    cache = TransferCache(str(tmp_path / "cache"), link_bps=1)
+    record = cache.prepare(entry)
+    assert record["compressed"] and record["codec"] not in LEGACY_CODECS
+
+    record, payload = cache.open_fallback(entry)
+    with payload:
+        assert record["codec"] in LEGACY_CODECS
+        assert zlib.decompress(payload.read()) == open(entry.path, 'rb').read()
+
+    def no_recompress(name):
+        raise AssertionError("fallback recompressed on a repeat request")
+    monkeypatch.setattr(cache_module, "get_codec", no_recompress)
+    again, payload = cache.open_fallback(entry)
+    payload.close()
+    assert again["size"] == record["size"]
+
+
+def test_dropping_a_record_removes_its_fallback(tmp_path, entry):
+    cache = TransferCache(str(tmp_path / "cache"), link_bps=1)
+    cache.open_fallback(entry)[1].close()
+    assert len(list((tmp_path / "cache").glob("*.z"))) == 2
+    cache.on_catalog_change([], [entry.name], [])
+    assert list((tmp_path / "cache").glob("*.z")) == []
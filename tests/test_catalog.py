@@ -0,0 +1,36 @@
+from akita_wais.catalog import FileCatalog
+
+
+def make_catalog(tmp_path, *names):
+    for name in names:
+        (tmp_path / name).write_bytes(name.encode())
+    catalog = FileCatalog(str(tmp_path))
+    catalog.rescan()
+    catalog._loaded = True
+    return catalog
+
+
+def test_changes_since_reports_the_delta(tmp_path):
+    catalog = make_catalog(tmp_path, "a.txt", "b.txt")
+    held = catalog.version
+    (tmp_path / "c.txt").write_bytes(b"c")
+    (tmp_path / "a.txt").unlink()
+    catalog.rescan()
+    version, etag, added, removed, changed = catalog.changes_since(held)
+    assert version == catalog.version != held
+    assert (added, removed, changed) == (["c.txt"], ["a.txt"], [])
+
+
+def test_version_from_another_run_gets_no_delta(tmp_path):
+    before = make_catalog(tmp_path, "a.txt")
+    after = make_catalog(tmp_path)
+    # Both runs count from the same start, so only the epoch tells their versions apart
+    assert before.version.split(":")[1] == after.version.split(":")[1]
+    assert after.changes_since(before.version) is None
+    assert after.changes_since(after.version) is not None
+
+
+def test_malformed_version_gets_no_delta(tmp_path):
+    catalog = make_catalog(tmp_path, "a.txt")
+    assert catalog.changes_since("garbage") is None
+    assert catalog.changes_since(1234) is None
@@ -0,0 +1,72 @@
+import os
+import hashlib
+import pytest
+
+pytest.importorskip("RNS")
+
+from akita_wais.client import AkitaWAISClient
+from akita_wais.resume import PartialDownload
+from akita_wais.common import (
+    ACTION_GET, ACTION_MANIFEST, STATUS_OK, STATUS_ERROR, CAP_RESOURCE, CAP_RANGE, PROTOCOL_VERSION, block_digest
+)
+
+BLOCK = 4096
+SERVER = {"hash": "<00>", "name": "test", "caps": [CAP_RESOURCE, CAP_RANGE], "version": PROTOCOL_VERSION}
+
+
+class RangeServer:
+    """Answers MANIFEST and ranged GETs for one file; the link drops on the ranged GET numbered drop_at."""
+
+    def __init__(self, data, drop_at=None):
+        self.data = data
+        self.drop_at = drop_at
+        self.ranges = []
+
+    def __call__(self, request, server=None, timeout=None):
+        if request["action"] == ACTION_MANIFEST:
+            blocks = [block_digest(self.data[i:i + BLOCK]) for i in range(0, len(self.data), BLOCK)]
+            return {"status": STATUS_OK, "block_size": BLOCK, "blocks": blocks,
+                    "size": len(self.data), "sha256": hashlib.sha256(self.data).hexdigest()}
+        assert request["action"] == ACTION_GET and "offset" in request
+        self.ranges.append(request["offset"])
+        if len(self.ranges) == self.drop_at:
+            return {"status": STATUS_ERROR, "message": "Link closed during transfer"}
+        chunk = self.data[request["offset"]:request["offset"] + request["length"]]
+        return {"status": STATUS_OK, "offset": request["offset"], "length": len(chunk), "file_size": len(self.data),
+                "sha256": hashlib.sha256(chunk).hexdigest(), "data": chunk}
+
+
+@pytest.fixture
+def client(config):
+    config["client"]["resume_range_kb"] = 2 * BLOCK // 1024
+    return AkitaWAISClient(config, None)
+
+
+def test_resource_download_resumes_after_link_drop(client):
+    data = os.urandom(10 * BLOCK + 123)
+    dest_path = client.dest_path("big.bin")
+
+    client._send_request_and_wait = RangeServer(data, drop_at=3)
+    res = client.get_file("big.bin", server=SERVER)
+    assert res["status"] == STATUS_ERROR
+    partial = PartialDownload.load(dest_path)
+    assert partial is not None and partial.state["verified"] == [0, 1, 2, 3]
+
+    server = RangeServer(data)
+    client._send_request_and_wait = server
+    res = client.get_file("big.bin", server=SERVER)
+    assert res["status"] == STATUS_OK
+    assert server.ranges[0] == 4 * BLOCK
+    with open(dest_path, 'rb') as f:
+        assert f.read() == data
+    assert PartialDownload.load(dest_path) is None
+
+
+def test_small_resource_download_is_one_range(client):
+    data = b"hello mesh\n" * 10
+    server = RangeServer(data)
+    client._send_request_and_wait = server
+    assert client.get_file("small.txt", server=SERVER)["status"] == STATUS_OK
+    assert server.ranges == [0]
+    with open(client.dest_path("small.txt"), 'rb') as f:
+        assert f.read() == data
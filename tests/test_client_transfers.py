@@ -0,0 +1,29 @@
+import os
+import hashlib
+from types import SimpleNamespace
+from concurrent.futures import Future
+import pytest
+
+pytest.importorskip("RNS")
+
+from akita_wais.client import AkitaWAISClient
+from akita_wais import wire
+from akita_wais.common import STATUS_FILE_META, STATUS_ERROR, MODE_RESOURCE
+
+
+def test_error_after_file_meta_ends_the_transfer(config):
+    client = AkitaWAISClient(config, None)
+    link = SimpleNamespace(hash=b"link")
+    future = Future()
+    client._pending[b"rid"] = {"future": future, "link_id": link.hash, "sid": None}
+
+    client._handle_response(link, b"rid", wire.dumps({
+        "status": STATUS_FILE_META, "filename": "small.txt", "size": 5, "original_size": 5,
+        "compressed": False, "sha256": hashlib.sha256(b"hello").hexdigest(), "mode": MODE_RESOURCE
+    }))
+    assert b"rid" in client._file_transfer_state
+
+    client._handle_response(link, b"rid", wire.dumps({"status": STATUS_ERROR, "message": "Resource transfer failed"}))
+    assert future.result(timeout=1)["status"] == STATUS_ERROR
+    assert client._file_transfer_state == {}
+    assert os.listdir(client.download_dir) == []
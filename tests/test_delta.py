@@ -0,0 +1,47 @@
+import os
+import hashlib
+from akita_wais.delta import MIN_BLOCK, signature, compute_delta, tail_delta, apply_delta
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_delta_rebuilds_an_edited_file(tmp_path):
+    old = os.urandom(40 * MIN_BLOCK)
+    new = old[:10 * MIN_BLOCK] + b"inserted" + old[10 * MIN_BLOCK + 100:] + b"appended"
+    local = write(tmp_path / "local", old)
+    remote = write(tmp_path / "remote", new)
+
+    ops, sha256 = compute_delta(remote, signature(local, MIN_BLOCK), max_literal=len(new))
+    assert sha256 == hashlib.sha256(new).hexdigest()
+    assert len(ops) < 4 * MIN_BLOCK
+    assert apply_delta(local, ops, MIN_BLOCK, local, sha256) == len(new)
+    assert read(local) == new
+
+
+def test_delta_gives_up_past_max_literal(tmp_path):
+    local = write(tmp_path / "local", os.urandom(8 * MIN_BLOCK))
+    remote = write(tmp_path / "remote", os.urandom(8 * MIN_BLOCK))
+    assert compute_delta(remote, signature(local, MIN_BLOCK), max_literal=MIN_BLOCK) is None
+
+
+def test_tail_delta_sends_only_appended_bytes(tmp_path):
+    old = b"line\n" * 1000
+    new = old + b"more\n" * 10
+    local = write(tmp_path / "local", old)
+    remote = write(tmp_path / "remote", new)
+
+    ops, sha256 = tail_delta(remote, len(new), len(old), hashlib.sha256(old).hexdigest(), max_literal=len(new))
+    assert len(ops) < 100
+    apply_delta(local, ops, len(old), local, sha256)
+    assert read(local) == new
+    # A rewritten prefix is not a tail
+    assert tail_delta(remote, len(new), len(old), hashlib.sha256(b"other").hexdigest(), max_literal=len(new)) is None
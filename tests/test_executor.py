@@ -0,0 +1,32 @@
+import time
+import threading
+import pytest
+from akita_wais.executor import TransferExecutor
+
+
+@pytest.fixture
+def busy_executor():
+    """A one-worker executor whose worker is held by a blocking job, so submitted jobs stay queued."""
+    executor = TransferExecutor(max_workers=1, per_key=1, max_queued=4)
+    release = threading.Event()
+    assert executor.submit("holder", release.wait)
+    deadline = time.time() + 5
+    while executor.stats()["running"] == 0:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    yield executor
+    release.set()
+    executor.shutdown()
+
+
+def test_queue_is_bounded_across_new_keys(busy_executor):
+    accepted = [busy_executor.submit(f"link-{i}", lambda: None) for i in range(50)]
+    assert accepted.count(True) == 4
+    assert busy_executor.stats()["queued"] == 4
+
+
+def test_busy_key_leaves_a_slot_for_a_new_key(busy_executor):
+    accepted = [busy_executor.submit("a", lambda: None) for _ in range(10)]
+    assert accepted.count(True) == 3
+    assert busy_executor.submit("b", lambda: None)
+    assert not busy_executor.submit("c", lambda: None)
@@ -0,0 +1,43 @@
+import time
+import threading
+from akita_wais.jobs import DownloadJobs, JOB_DONE
+from akita_wais.common import STATUS_OK
+
+
+class FakeClient:
+    def __init__(self, tmp_path, gate=None):
+        self.tmp_path = tmp_path
+        self.gate = gate
+
+    def dest_path(self, filename):
+        return str(self.tmp_path / filename)
+
+    def get_file(self, filename, server=None):
+        if self.gate: self.gate.wait()
+        return {"status": STATUS_OK, "message": "ok"}
+
+
+def wait_done(jobs, job_id):
+    deadline = time.time() + 5
+    while jobs.get(job_id)["status"] != JOB_DONE:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_finished_jobs_do_not_count_against_max_jobs(tmp_path):
+    jobs = DownloadJobs(FakeClient(tmp_path), max_parallel=1, max_jobs=2)
+    for i in range(5):
+        job = jobs.submit(f"file-{i}")
+        assert job is not None
+        wait_done(jobs, job["id"])
+    assert len(jobs.list()) <= 2
+    jobs.shutdown()
+
+
+def test_active_jobs_are_capped(tmp_path):
+    gate = threading.Event()
+    jobs = DownloadJobs(FakeClient(tmp_path, gate), max_parallel=1, max_jobs=2)
+    assert jobs.submit("a") and jobs.submit("b")
+    assert jobs.submit("c") is None
+    gate.set()
+    jobs.shutdown()
@@ -0,0 +1,34 @@
+import hashlib
+import pytest
+
+pytest.importorskip("RNS")
+
+from akita_wais.client import AkitaWAISClient
+from akita_wais.mirror import DirectoryMirror, SYNC_NEW
+from akita_wais.common import ACTION_GET, ACTION_STAT, STATUS_OK, CAP_STAT, PROTOCOL_VERSION
+
+SERVER = {"hash": "<00>", "name": "test", "caps": [CAP_STAT], "version": PROTOCOL_VERSION}
+DATA = b"sensor readings\n"
+
+
+def test_changed_file_costs_one_stat(config, tmp_path):
+    client = AkitaWAISClient(config, None)
+    # A non-empty content store is what makes get_file stat on its own
+    held = tmp_path / "held.txt"
+    held.write_bytes(b"something else")
+    client.store.add(str(held), hashlib.sha256(b"something else").hexdigest())
+    actions = []
+
+    def fake_server(request, server=None, timeout=None):
+        actions.append(request["action"])
+        if request["action"] == ACTION_STAT:
+            return {"status": STATUS_OK, "size": len(DATA), "sha256": hashlib.sha256(DATA).hexdigest()}
+        assert request["action"] == ACTION_GET
+        with open(client.dest_path(request["filename"]), 'wb') as f:
+            f.write(DATA)
+        return {"status": STATUS_OK}
+
+    client._send_request_and_wait = fake_server
+    outcome, _ = DirectoryMirror(client, SERVER).sync_file("readings.log")
+    assert outcome == SYNC_NEW
+    assert actions == [ACTION_STAT, ACTION_GET]
@@ -0,0 +1,28 @@
+import time
+from akita_wais.peers import PeerRegistry
+
+
+def test_recent_is_newest_first_and_capped(tmp_path):
+    registry = PeerRegistry(str(tmp_path / "peers.db"), max_peers=2)
+    registry.load()
+    for name in ("a", "b", "c"):
+        registry.update(name, {"name": name})
+    registry.update("b", {"name": "b"})
+    assert [p["name"] for p in registry.recent()] == ["b", "c"]
+    registry.close()
+
+
+def test_peers_survive_a_restart_and_expire(tmp_path, monkeypatch):
+    path = str(tmp_path / "peers.db")
+    registry = PeerRegistry(path, ttl=60)
+    registry.load()
+    registry.update("a", {"name": "a"})
+    registry.close()
+
+    reloaded = PeerRegistry(path, ttl=60)
+    reloaded.load()
+    assert reloaded.get("a")["name"] == "a"
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert reloaded.get("a") is None and len(reloaded) == 0
+    reloaded.close()
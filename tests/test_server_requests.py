@@ -0,0 +1,51 @@
+import json
+import pytest
+
+pytest.importorskip("RNS")
+
+from akita_wais.server import AkitaWAISServer
+from akita_wais import wire
+from akita_wais.common import ACTION_SEARCH, STATUS_OK, STATUS_ERROR
+
+
+class FakeLink:
+    hash = b"link"
+    MDU = 384
+
+    def __init__(self):
+        self.responses = []
+
+    def respond(self, request_id, data):
+        self.responses.append(data)
+
+
+@pytest.fixture
+def server(config, tmp_path):
+    (tmp_path / "data" / "notes.txt").write_bytes(b"field notes")
+    server = AkitaWAISServer(config, None)
+    server.catalog.rescan()
+    return server
+
+
+def request(server, message, binary=False):
+    link = FakeLink()
+    server._handle_request(link, b"rid", wire.dumps(message, binary=binary))
+    return link.responses[-1]
+
+
+@pytest.mark.parametrize("fields", [{"limit": None}, {"offset": None}, {"offset": -5, "limit": 0}, {"limit": "10"}])
+def test_search_tolerates_missing_and_out_of_range_paging(server, fields):
+    res = wire.loads(request(server, dict({"action": ACTION_SEARCH, "query": "notes"}, **fields)))
+    assert res["status"] == STATUS_OK
+    assert res["offset"] >= 0
+
+
+def test_search_rejects_non_numeric_paging(server):
+    res = wire.loads(request(server, {"action": ACTION_SEARCH, "query": "notes", "offset": "first"}))
+    assert res == {"status": STATUS_ERROR, "message": "Invalid offset or limit"}
+
+
+def test_reply_encoding_follows_the_latest_request(server):
+    search = {"action": ACTION_SEARCH, "query": "notes"}
+    assert wire.is_binary(request(server, search, binary=True))
+    assert json.loads(request(server, search))["status"] == STATUS_OK
@@ -0,0 +1,38 @@
+import json
+import hashlib
+import pytest
+from akita_wais import wire
+
+MESSAGE = {
+    "status": "file_meta",
+    "filename": "notes.txt",
+    "size": 123456,
+    "offset": -1,
+    "compressed": True,
+    "codec": None,
+    "sha256": hashlib.sha256(b"notes").hexdigest(),
+    "files": ["a.txt", "b.txt"],
+    "ratio": 0.25,
+    "extra": {"nested": [1, "two", False]}
+}
+
+
+def test_binary_round_trip_is_lossless_and_smaller():
+    data = wire.dumps(MESSAGE, binary=True)
+    assert wire.is_binary(data)
+    assert wire.loads(data) == MESSAGE
+    assert len(data) < len(wire.dumps(MESSAGE))
+
+
+def test_json_messages_still_decode():
+    data = wire.dumps(MESSAGE)
+    assert not wire.is_binary(data)
+    assert json.loads(data) == wire.loads(data) == MESSAGE
+
+
+def test_malformed_binary_is_a_value_error():
+    data = wire.dumps(MESSAGE, binary=True)
+    with pytest.raises(ValueError):
+        wire.loads(data[:-3])
+    with pytest.raises(ValueError):
+        wire.loads(data + b"\x00")